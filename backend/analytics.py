@@ -4,6 +4,8 @@ from __future__ import annotations
 import os
 from typing import Any, Iterable
 
+import numpy as np
+
 TRADING_DAYS_PER_YEAR = 252
 RISK_FREE_RATE_ANNUAL = float(os.environ.get("RISK_FREE_RATE_ANNUAL", "0.04"))  # e.g. 0.04 = 4% T-bills
 
@@ -21,6 +23,22 @@ def _pct(x: float) -> float:
     return float(x) * 100.0
 
 
+def _drawdown(values: np.ndarray) -> tuple[np.ndarray, float, int, int]:
+    """
+    Drawdown vs running peak. Returns (dd_series, max_dd, peak_idx, trough_idx) where
+    trough_idx is the first bar at the deepest drawdown and peak_idx the bar that set its peak.
+    """
+    peaks = np.maximum.accumulate(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = np.where(peaks != 0, (values - peaks) / peaks, 0.0)
+    trough = int(np.argmin(dd))
+    max_dd = float(dd[trough])
+    if max_dd >= 0:
+        return dd, 0.0, 0, 0
+    peak = int(np.argmax(values[: trough + 1] == peaks[trough]))
+    return dd, max_dd, peak, trough
+
+
 def _expand_equity_to_daily(
     equity_curve: Iterable[dict],
     initial_cash: float,
@@ -41,22 +59,40 @@ def _expand_equity_to_daily(
     values = [_safe_float(p.get("v")) for p in points]
     times = [p.get("time") for p in points]
 
-    valid_times = [t for t in times if t and len(str(t)) >= 10]
-    if not valid_times:
+    # Parse all times once; undated points are placed on the first dated day.
+    parsed = pd.to_datetime(pd.Index(times, dtype=object), errors="coerce", format="ISO8601")
+    dated = ~parsed.isna()
+    if not dated.any():
         return values, times
 
     try:
-        start_d = min(valid_times)[:10]
-        end_d = max(valid_times)[:10]
-        dates = pd.date_range(start=start_d, end=end_d, freq="B")
+        if parsed.tz is not None:
+            parsed = parsed.tz_localize(None)
+        point_i8 = parsed.normalize().asi8
+        start_i8 = point_i8[dated].min()
+        point_i8 = np.where(dated, point_i8, start_i8)
+        dates = pd.date_range(start=pd.Timestamp(start_i8), end=pd.Timestamp(point_i8.max()), freq="B")
         if len(dates) == 0:
             return values, times
-        idx = pd.to_datetime([(t or start_d)[:10] for t in times])
-        series = pd.Series(values, index=idx)
-        series = series[~series.index.duplicated(keep="last")]
-        series = series.reindex(dates).ffill().bfill()
-        series = series.fillna(initial_cash)
-        return series.tolist(), [d.strftime("%Y-%m-%d") for d in dates]
+        day_i8 = dates.asi8
+        # Scatter each point onto its business day (points on non-business days are dropped),
+        # last point wins per day, then forward/back fill the gaps.
+        pos = np.minimum(np.searchsorted(day_i8, point_i8), len(day_i8) - 1)
+        hit = np.flatnonzero(day_i8[pos] == point_i8)
+        _, first_from_end = np.unique(pos[hit][::-1], return_index=True)
+        last = hit[len(hit) - 1 - first_from_end]
+        out = np.full(len(day_i8), np.nan)
+        out[pos[last]] = np.asarray(values, dtype=np.float64)[last]
+        filled = ~np.isnan(out)
+        if not filled.any():
+            out[:] = initial_cash
+        else:
+            src = np.where(filled, np.arange(len(out)), 0)
+            np.maximum.accumulate(src, out=src)
+            out = out[src]
+            first = int(np.argmax(filled))
+            out[:first] = out[first]
+        return out.tolist(), dates.strftime("%Y-%m-%d").tolist()
     except Exception:
         return values, times
 
@@ -81,66 +117,43 @@ def compute_equity_metrics(
     pnl = end_value - start_value
     total_return = (pnl / start_value) if start_value else 0.0
 
-    peak = start_value
-    max_dd = 0.0
-    max_dd_duration = 0
-    dd_start = 0
-    dd_series = []
-    for i, v in enumerate(values):
-        if v > peak:
-            peak = v
-            dd_start = i
-        dd = (v - peak) / peak if peak else 0.0
-        dd_series.append(dd)
-        if dd < max_dd:
-            max_dd = dd
-            max_dd_duration = i - dd_start
+    vals = np.asarray(values, dtype=np.float64)
+    dd_series, max_dd, dd_start, dd_end = _drawdown(vals)
+    max_dd_duration = dd_end - dd_start
 
     # Daily returns for proper Sharpe/Sortino
     daily_values, daily_dates = _expand_equity_to_daily(points, initial_cash)
+    daily = np.asarray(daily_values, dtype=np.float64)
 
     # Max drawdown duration in calendar days (from daily series)
     max_dd_duration_days = 0
-    if len(daily_values) > 1 and daily_dates and len(daily_dates) == len(daily_values):
-        peak_daily = daily_values[0]
-        dd_start_idx = 0
-        max_dd_daily = 0.0
-        for i, v in enumerate(daily_values):
-            if v > peak_daily:
-                peak_daily = v
-                dd_start_idx = i
-            dd = (v - peak_daily) / peak_daily if peak_daily else 0.0
-            if dd < max_dd_daily:  # deeper drawdown
-                max_dd_daily = dd
-                try:
-                    from datetime import datetime
-                    start_d = datetime.strptime(str(daily_dates[dd_start_idx])[:10], "%Y-%m-%d")
-                    end_d = datetime.strptime(str(daily_dates[i])[:10], "%Y-%m-%d")
-                    max_dd_duration_days = (end_d - start_d).days
-                except Exception:
-                    max_dd_duration_days = i - dd_start_idx
-    daily_returns = []
-    for i in range(1, len(daily_values)):
-        prev, cur = daily_values[i - 1], daily_values[i]
-        if prev and prev > 0:
-            daily_returns.append((cur / prev) - 1.0)
-        else:
-            daily_returns.append(0.0)
-
-    n_daily = len(daily_returns)
-    avg_daily = sum(daily_returns) / n_daily if n_daily else 0.0
-    var_daily = sum((r - avg_daily) ** 2 for r in daily_returns) / (n_daily - 1) if n_daily > 1 else 0.0
-    stdev_daily = var_daily ** 0.5
+    if len(daily) > 1 and daily_dates and len(daily_dates) == len(daily):
+        _, max_dd_daily, dd_start_idx, dd_end_idx = _drawdown(daily)
+        if max_dd_daily < 0:
+            try:
+                from datetime import datetime
+                start_d = datetime.strptime(str(daily_dates[dd_start_idx])[:10], "%Y-%m-%d")
+                end_d = datetime.strptime(str(daily_dates[dd_end_idx])[:10], "%Y-%m-%d")
+                max_dd_duration_days = (end_d - start_d).days
+            except Exception:
+                max_dd_duration_days = dd_end_idx - dd_start_idx
+    prev, cur = daily[:-1], daily[1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily_returns = np.where(prev > 0, cur / prev - 1.0, 0.0)
+
+    n_daily = daily_returns.size
+    avg_daily = float(daily_returns.mean()) if n_daily else 0.0
+    stdev_daily = float(daily_returns.std(ddof=1)) if n_daily > 1 else 0.0
 
     # Annualized metrics
     rf_daily = RISK_FREE_RATE_ANNUAL / TRADING_DAYS_PER_YEAR
     excess_daily = avg_daily - rf_daily
     sharpe_annual = (excess_daily / stdev_daily * (TRADING_DAYS_PER_YEAR ** 0.5)) if stdev_daily else 0.0
 
-    downside_returns = [r for r in daily_returns if r < 0]
+    downside_returns = daily_returns[daily_returns < 0]
     downside_var = (
-        sum(r ** 2 for r in downside_returns) / (len(downside_returns) - 1)
-        if len(downside_returns) > 1
+        float(np.square(downside_returns).sum()) / (downside_returns.size - 1)
+        if downside_returns.size > 1
         else 0.0
     )
     downside_stdev = downside_var ** 0.5
@@ -155,17 +168,11 @@ def compute_equity_metrics(
     calmar_annual = (cagr / abs(max_dd)) if max_dd != 0 else (cagr if cagr else 0.0)
 
     # Turnover (from trade-to-trade)
-    trade_returns = []
-    for i in range(1, len(values)):
-        prev, cur = values[i - 1], values[i]
-        if prev and prev > 0:
-            trade_returns.append((cur / prev) - 1.0)
-    avg_trade_r = sum(trade_returns) / len(trade_returns) if trade_returns else 0.0
-    stdev_trade_r = (
-        (sum((r - avg_trade_r) ** 2 for r in trade_returns) / (len(trade_returns) - 1)) ** 0.5
-        if len(trade_returns) > 1
-        else 0.0
-    )
+    prev, cur = vals[:-1], vals[1:]
+    positive = prev > 0
+    trade_returns = cur[positive] / prev[positive] - 1.0
+    avg_trade_r = float(trade_returns.mean()) if trade_returns.size else 0.0
+    stdev_trade_r = float(trade_returns.std(ddof=1)) if trade_returns.size > 1 else 0.0
     sharpe_like_trade = (avg_trade_r / stdev_trade_r) if stdev_trade_r else 0.0
 
     return {
@@ -178,8 +185,8 @@ def compute_equity_metrics(
         "max_drawdown_pct": _pct(max_dd),
         "max_drawdown_duration": max_dd_duration,
         "max_drawdown_duration_days": max_dd_duration_days,
-        "peak_value": float(max(values)) if values else start_value,
-        "low_value": float(min(values)) if values else start_value,
+        "peak_value": float(vals.max()),
+        "low_value": float(vals.min()),
         "points": len(values),
         "sharpe_annual": float(sharpe_annual),
         "sortino_annual": float(sortino_annual),
@@ -189,56 +196,65 @@ def compute_equity_metrics(
         "trade_to_trade_avg_return_pct": _pct(avg_trade_r),
         "trade_to_trade_stdev_return": stdev_trade_r,
         "trade_to_trade_sharpe_like": sharpe_like_trade,
-        "drawdown_series": dd_series,
+        "drawdown_series": dd_series.tolist(),
     }
 
 
-def compute_trade_metrics(trade_log: Iterable[dict]) -> dict:
-    trades = list(trade_log or [])
-    exits = [t for t in trades if str(t.get("type", "")).lower() == "exit"]
+def _trades_to_arrays(trade_log: Iterable[dict]) -> dict[str, np.ndarray]:
+    """Coerce the trade log to columns once: realized_pnl, is_exit and |cost| (cost, else proceeds, else amount)."""
+    realized, is_exit, cost = [], [], []
+    for t in trade_log or []:
+        realized.append(_safe_float(t.get("realized_pnl")))
+        is_exit.append(str(t.get("type", "")).lower() == "exit")
+        cost.append(_safe_float(t.get("cost"), 0) or _safe_float(t.get("proceeds"), 0) or _safe_float(t.get("amount"), 0))
+    return {
+        "realized_pnl": np.asarray(realized, dtype=np.float64),
+        "is_exit": np.asarray(is_exit, dtype=bool),
+        "cost": np.abs(np.asarray(cost, dtype=np.float64)),
+    }
 
-    realized_exits = [_safe_float(t.get("realized_pnl")) for t in exits]
-    wins = [x for x in realized_exits if x > 0]
-    losses = [x for x in realized_exits if x < 0]
 
-    gross_profit = float(sum(wins))
-    gross_loss = float(sum(losses))
-    net_realized = float(sum(realized_exits))
-    win_rate = (len(wins) / len(realized_exits)) if realized_exits else 0.0
+def compute_trade_metrics(trade_log: Iterable[dict]) -> dict:
+    cols = _trades_to_arrays(trade_log)
+    realized = cols["realized_pnl"]
+    exits = realized[cols["is_exit"]]
+    wins = exits[exits > 0]
+    losses = exits[exits < 0]
+    n_trades, n_exits, n_wins, n_losses = realized.size, exits.size, wins.size, losses.size
+    gross_profit = float(wins.sum())
+    gross_loss = float(losses.sum())
+    max_win = float(wins.max()) if n_wins else 0.0
+    max_loss = float(losses.min()) if n_losses else 0.0
+    realized_all = float(realized.sum())
+    # Turnover: sum of |trade value| / avg portfolio value
+    turnover = float(cols["cost"].sum())
+
+    net_realized = gross_profit + gross_loss
+    win_rate = (n_wins / n_exits) if n_exits else 0.0
 
     profit_factor = None
-    if losses:
-        denom = abs(sum(losses))
+    if n_losses:
+        denom = abs(gross_loss)
         profit_factor = (gross_profit / denom) if denom else None
 
-    avg_win = (sum(wins) / len(wins)) if wins else 0.0
-    avg_loss = (sum(losses) / len(losses)) if losses else 0.0
-
-    realized_all = float(sum(_safe_float(t.get("realized_pnl")) for t in trades))
-
-    # Turnover: sum of |trade value| / avg portfolio value
-    trade_values = []
-    for t in trades:
-        cost = _safe_float(t.get("cost"), 0) or _safe_float(t.get("proceeds"), 0) or _safe_float(t.get("amount"), 0)
-        if cost:
-            trade_values.append(abs(cost))
-    turnover = sum(trade_values) if trade_values else 0.0
+    avg_win = (gross_profit / n_wins) if n_wins else 0.0
+    avg_loss = (gross_loss / n_losses) if n_losses else 0.0
 
     return {
-        "trades": len(trades),
-        "exits": len(exits),
-        "wins": len(wins),
-        "losses": len(losses),
+        "trades": n_trades,
+        "exits": n_exits,
+        "wins": n_wins,
+        "losses": n_losses,
         "win_rate": win_rate,
         "win_rate_pct": _pct(win_rate),
-        "gross_profit": gross_profit,
-        "gross_loss": gross_loss,
-        "net_realized_exits": net_realized,
-        "net_realized_all": realized_all,
+        "gross_profit": float(gross_profit),
+        "gross_loss": float(gross_loss),
+        "net_realized_exits": float(net_realized),
+        "net_realized_all": float(realized_all),
         "avg_win": float(avg_win),
         "avg_loss": float(avg_loss),
-        "max_win": float(max(wins)) if wins else 0.0,
-        "max_loss": float(min(losses)) if losses else 0.0,
+        "max_win": float(max_win),
+        "max_loss": float(max_loss),
         "profit_factor": profit_factor,
         "turnover": turnover,
     }
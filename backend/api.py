@@ -1,20 +1,28 @@
 """AceMarket API — built with FastAPI server, has auth, persistence, and rate limiting"""
+import asyncio
 import hashlib
+import heapq
 import json
 import logging
+import math
+import re
 import time
 import uuid
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from threading import Lock
 from contextlib import asynccontextmanager
-from typing import Any, Optional
+from typing import Annotated, Any, Optional
 
 import numpy as np
 import pandas as pd
+from cachetools import TTLCache
 from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from starlette.requests import Request
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from analytics import compute_report
 
@@ -35,7 +43,7 @@ def _to_native(obj: Any) -> Any:
     return json.loads(json.dumps(obj, default=_json_default))
 from backtest import Backtest, create_strategy_from_code
 from portfolio import Portfolio
-from stock import Stock, make_minimal_stock
+from stock import Stock, default_date_range, make_minimal_stock, nan_to_none
 
 logger = logging.getLogger(__name__)
 
@@ -53,9 +61,11 @@ from config import (
     RATE_LIMIT_GENERAL_WINDOW_SEC,
     RATE_LIMIT_STRATEGY_MAX,
     RATE_LIMIT_STRATEGY_WINDOW_SEC,
+    REDIS_URL,
     SEARCH_QUERY_MAX_LEN,
     STOCK_CACHE_MAX,
     STOCK_CACHE_TTL_SEC,
+    STRATEGY_PROCESS_WORKERS,
     STRATEGY_CODE_MAX_LEN,
     STRATEGY_NAME_MAX_LEN,
     SYMBOL_ALLOWED_CHARS,
@@ -69,8 +79,21 @@ if DISABLE_AUTH:
     logger.warning("DISABLE_AUTH is set — authentication is bypassed (development only).")
 
 
-# Rate limiting: in-memory per process (use Redis for multi-worker production)
-_rate_limit_store: dict[str, list[float]] = {}
+# Rate limiting: sliding window in a Redis sorted set when REDIS_URL is set (one limit across all workers),
+# otherwise per process in memory. Redis errors fall back to the in-memory window.
+_rate_limit_store: dict[str, deque] = {}
+_rate_limit_lock = Lock()
+
+try:
+    import redis
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis = redis_asyncio = None
+
+if REDIS_URL and redis is None:
+    logger.warning("REDIS_URL is set but the redis package is not installed — rate limits are per process.")
+_redis = redis.Redis.from_url(REDIS_URL) if REDIS_URL and redis is not None else None
+_redis_async = redis_asyncio.Redis.from_url(REDIS_URL) if REDIS_URL and redis is not None else None
 
 # Monte Carlo background jobs: job_id -> { status, result?, error? }
 _montecarlo_jobs: dict[str, dict] = {}
@@ -79,15 +102,76 @@ _montecarlo_jobs: dict[str, dict] = {}
 _backtest_jobs: dict[str, dict] = {}
 
 
-def _check_rate_limit(key: str, window: int, max_calls: int) -> None:
+def _rate_limit_exceeded(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Rate limit exceeded. Try again later.",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def _check_rate_limit_memory(key: str, window: int, max_calls: int) -> int:
     now = time.time()
-    if key not in _rate_limit_store:
-        _rate_limit_store[key] = []
-    times = _rate_limit_store[key]
-    times[:] = [t for t in times if now - t < window]
-    if len(times) >= max_calls:
-        raise HTTPException(status_code=429, detail="Rate limit exceeded. Try again later.")
-    times.append(now)
+    with _rate_limit_lock:
+        times = _rate_limit_store.setdefault(key, deque())
+        while times and now - times[0] >= window:
+            times.popleft()
+        if len(times) >= max_calls:
+            raise _rate_limit_exceeded(times[0] + window - now)
+        times.append(now)
+        return max_calls - len(times)
+
+
+def _queue_redis_window(pipe, key: str, window: int, member: str, now: float):
+    """Queue one sliding-window step: trim expired calls, record this one, count, fetch the oldest."""
+    key = f"ratelimit:{key}"
+    pipe.zremrangebyscore(key, 0, now - window)
+    pipe.zadd(key, {member: now})
+    pipe.zcard(key)
+    pipe.zrange(key, 0, 0, withscores=True)
+    pipe.expire(key, window)
+    return pipe
+
+
+def _redis_retry_after(results: list, window: int, max_calls: int, now: float) -> Optional[float]:
+    """Seconds until a slot frees up if this call is over the limit, else None."""
+    if results[2] <= max_calls:
+        return None
+    oldest = results[3][0][1] if results[3] else now
+    return oldest + window - now
+
+
+def _check_rate_limit(key: str, window: int, max_calls: int) -> int:
+    """Sliding-window limit. Returns the calls left in the window; raises 429 (with Retry-After) when exhausted."""
+    if _redis is not None:
+        now, member = time.time(), uuid.uuid4().hex
+        try:
+            results = _queue_redis_window(_redis.pipeline(), key, window, member, now).execute()
+            retry_after = _redis_retry_after(results, window, max_calls, now)
+            if retry_after is not None:
+                _redis.zrem(f"ratelimit:{key}", member)  # rejected calls do not use up the window
+                raise _rate_limit_exceeded(retry_after)
+            return max_calls - results[2]
+        except redis.RedisError as e:
+            logger.warning("Redis rate limit unavailable, using in-memory window: %s", e)
+    return _check_rate_limit_memory(key, window, max_calls)
+
+
+async def _check_rate_limit_async(key: str, window: int, max_calls: int) -> int:
+    """_check_rate_limit for the event loop: Redis round-trips are awaited instead of blocking."""
+    if _redis_async is not None:
+        now, member = time.time(), uuid.uuid4().hex
+        try:
+            async with _redis_async.pipeline() as pipe:
+                results = await _queue_redis_window(pipe, key, window, member, now).execute()
+            retry_after = _redis_retry_after(results, window, max_calls, now)
+            if retry_after is not None:
+                await _redis_async.zrem(f"ratelimit:{key}", member)
+                raise _rate_limit_exceeded(retry_after)
+            return max_calls - results[2]
+        except redis.RedisError as e:
+            logger.warning("Redis rate limit unavailable, using in-memory window: %s", e)
+    return _check_rate_limit_memory(key, window, max_calls)
 
 
 @asynccontextmanager
@@ -95,6 +179,8 @@ async def lifespan(app):
     db.init_db()
     logger.info("AceMarket API started. Auth: %s", "disabled" if DISABLE_AUTH else "enabled")
     yield
+    if _strategy_pool is not None:
+        _strategy_pool.shutdown(wait=False, cancel_futures=True)
     db.close_conn()
     logger.info("AceMarket API shutdown complete")
 
@@ -106,6 +192,7 @@ app = FastAPI(
     docs_url=None if IS_PRODUCTION else "/docs",
     redoc_url=None if IS_PRODUCTION else "/redoc",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,  # trade logs / equity curves are large; orjson encodes them several times faster
 )
 
 # CORS: never allow * with credentials. In production, no fallback (empty = no origins).
@@ -122,52 +209,100 @@ app.add_middleware(
 )
 
 
-_RATE_LIMIT_SKIP_PATHS = {"/health", "/docs", "/redoc", "/openapi.json"}
+# Trailing-slash variants listed up front so the middleware can test scope["path"] as-is.
+_RATE_LIMIT_SKIP_PATHS = frozenset({"/health", "/health/", "/docs", "/docs/", "/redoc", "/redoc/", "/openapi.json"})
+
+_SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    (b"content-security-policy", b"default-src 'none'; frame-ancestors 'none'"),
+]
+
+
+class RateLimitMiddleware:
+    """General rate limit for API routes (by auth token or IP). When auth is disabled, use IP only to prevent bypass.
+    Plain ASGI rather than @app.middleware("http"), which wraps each request in BaseHTTPMiddleware's extra task."""
+
+    def __init__(self, app, skip_paths: frozenset[str], window: int, max_calls: int):
+        self.app = app
+        self.skip_paths = frozenset(skip_paths)
+        self.window = window
+        self.max_calls = max_calls
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        if path in self.skip_paths or not path.startswith("/api"):
+            return await self.app(scope, receive, send)
+        client = scope.get("client")
+        ip = client[0] if client else "unknown"
+        auth = b""
+        if not DISABLE_AUTH:
+            for name, value in scope["headers"]:
+                if name == b"authorization":
+                    auth = value
+                    break
+        key = f"general:{hashlib.sha256(auth).hexdigest()}" if auth else f"general:ip:{ip}"
+        limit_headers = [(b"x-ratelimit-limit", str(self.max_calls).encode())]
+        try:
+            remaining = await _check_rate_limit_async(key, self.window, self.max_calls)
+        except HTTPException as e:
+            headers = {**e.headers, "X-RateLimit-Limit": str(self.max_calls), "X-RateLimit-Remaining": "0"}
+            return await ORJSONResponse({"detail": e.detail}, status_code=e.status_code, headers=headers)(scope, receive, send)
+        limit_headers.append((b"x-ratelimit-remaining", str(remaining).encode()))
 
+        async def send_with_limit_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + limit_headers
+            await send(message)
 
-@app.middleware("http")
-async def rate_limit_middleware(request: Request, call_next):
-    """General rate limit for API routes (by auth token or IP). When auth is disabled, use IP only to prevent bypass."""
-    path = request.url.path.rstrip("/")
-    if path in _RATE_LIMIT_SKIP_PATHS or not path.startswith("/api"):
-        return await call_next(request)
-    ip = request.client.host if request.client else "unknown"
-    if DISABLE_AUTH:
-        key = f"general:ip:{ip}"
-    else:
-        auth = request.headers.get("Authorization") or ""
-        if auth:
-            key = f"general:{hashlib.sha256(auth.encode()).hexdigest()}"
-        else:
-            key = f"general:ip:{ip}"
-    try:
-        _check_rate_limit(key, RATE_LIMIT_GENERAL_WINDOW_SEC, RATE_LIMIT_GENERAL_MAX)
-    except HTTPException:
-        raise
-    return await call_next(request)
+        await self.app(scope, receive, send_with_limit_headers)
 
 
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
+class SecurityHeadersMiddleware:
     """Add security headers to all responses."""
-    response = await call_next(request)
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    response.headers["Content-Security-Policy"] = "default-src 'none'; frame-ancestors 'none'"
-    return response
 
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + _SECURITY_HEADERS
+            await send(message)
 
-# In-memory stock cache (shared across users)
-_stock_cache: dict[str, dict] = {}
+        await self.app(scope, receive, send_with_headers)
+
+
+# Added last = outermost: security headers also land on 429 responses.
+app.add_middleware(
+    RateLimitMiddleware,
+    skip_paths=_RATE_LIMIT_SKIP_PATHS,
+    window=RATE_LIMIT_GENERAL_WINDOW_SEC,
+    max_calls=RATE_LIMIT_GENERAL_MAX,
+)
+app.add_middleware(SecurityHeadersMiddleware)
+
+
+# In-memory stock cache (shared across users). TTLCache gives O(1) lookup and LRU eviction;
+# entries expire STOCK_CACHE_TTL_SEC after they were loaded. Not thread-safe on its own.
+_stock_cache: TTLCache = TTLCache(maxsize=STOCK_CACHE_MAX, ttl=STOCK_CACHE_TTL_SEC)
 _stock_cache_lock = Lock()
 
 # Chart response cache: key -> {ts, data}. TTL 5 min.
-_chart_cache: dict[str, dict] = {}
-_chart_cache_lock = Lock()
 CHART_CACHE_TTL = 300
 CHART_CACHE_MAX = 32
+_chart_cache: TTLCache = TTLCache(maxsize=CHART_CACHE_MAX, ttl=CHART_CACHE_TTL)
+_chart_cache_lock = Lock()
+
+
+_SYMBOL_CHARS_RE = re.compile(f"[{re.escape(''.join(sorted(SYMBOL_ALLOWED_CHARS)))}]+")
 
 
 def _validate_symbol(symbol: str) -> str:
@@ -177,7 +312,7 @@ def _validate_symbol(symbol: str) -> str:
         raise HTTPException(status_code=400, detail="Symbol cannot be empty")
     if len(s) > SYMBOL_MAX_LEN:
         raise HTTPException(status_code=400, detail=f"Symbol too long (max {SYMBOL_MAX_LEN})")
-    if not all(c in SYMBOL_ALLOWED_CHARS for c in s):
+    if not _SYMBOL_CHARS_RE.fullmatch(s):
         raise HTTPException(status_code=400, detail="Symbol contains invalid characters")
     return s
 
@@ -211,30 +346,64 @@ def _safe_error_message(e: Exception) -> str:
 
 def get_stock(symbol: str) -> Stock:
     symbol = _validate_symbol(symbol)
-    now = time.time()
     with _stock_cache_lock:
-        expired = [k for k, v in _stock_cache.items() if now - float(v.get("ts", 0)) > STOCK_CACHE_TTL_SEC]
-        for k in expired:
-            _stock_cache.pop(k, None)
-
-        if symbol not in _stock_cache:
-            stock = Stock(symbol)
-            if stock.df.empty:
-                raise HTTPException(status_code=404, detail=f"No data for {symbol}")
-            _stock_cache[symbol] = {"ts": now, "stock": stock}
-            if len(_stock_cache) > STOCK_CACHE_MAX:
-                lru = min(_stock_cache.items(), key=lambda kv: float(kv[1].get("ts", 0)))[0]
-                if lru != symbol:
-                    _stock_cache.pop(lru, None)
-            _stock_cache[symbol]["ts"] = now
-            return _stock_cache[symbol]["stock"]
-        _stock_cache[symbol]["ts"] = now
-        return _stock_cache[symbol]["stock"]
-
-
-def get_portfolio(user_id: str) -> Portfolio:
-    """Load or create portfolio for user. Applies settings from db."""
-    settings = db.get_settings(user_id)
+        stock = _stock_cache.get(symbol)
+    if stock is not None:
+        return stock
+    # Download outside the lock so one slow symbol does not block lookups of cached ones.
+    stock = Stock(symbol)
+    if stock.df.empty:
+        raise HTTPException(status_code=404, detail=f"No data for {symbol}")
+    with _stock_cache_lock:
+        _stock_cache[symbol] = stock
+    return stock
+
+
+def _cached_stock(symbol: str) -> Optional[Stock]:
+    """The Stock get_stock(symbol) would serve from memory, or None (invalid symbols count as not cached).
+    Callers use the returned object rather than calling get_stock again, which could miss if the entry expires."""
+    try:
+        symbol = _validate_symbol(symbol)
+    except HTTPException:
+        return None
+    with _stock_cache_lock:
+        return _stock_cache.get(symbol)
+
+
+def prefetch_stocks(symbols: list[str]) -> None:
+    """Warm the stock cache for uncached symbols with one batched download. Failures are left to get_stock."""
+    valid = []
+    for s in symbols:
+        try:
+            valid.append(_validate_symbol(s))
+        except HTTPException:
+            continue
+    with _stock_cache_lock:
+        missing = [s for s in dict.fromkeys(valid) if s not in _stock_cache]
+    if len(missing) < 2:
+        return
+    try:
+        loaded = Stock.bulk(missing)
+    except Exception as e:
+        logger.warning("Batched download failed for %s: %s", ",".join(missing), e)
+        return
+    with _stock_cache_lock:
+        _stock_cache.update(loaded)
+
+
+async def settings_dep(request: Request, user_id: str = Depends(verify_token)) -> dict:
+    """User settings, read from the db at most once per request (memoized on request.state)."""
+    settings = getattr(request.state, "settings", None)
+    if settings is None:
+        settings = await asyncio.to_thread(db.get_settings, user_id)
+        request.state.settings = settings
+    return settings
+
+
+def get_portfolio(user_id: str, settings: Optional[dict] = None) -> Portfolio:
+    """Load or create portfolio for user. Applies settings (read from db unless the caller already has them)."""
+    if settings is None:
+        settings = db.get_settings(user_id)
 
     def _get_stock(sym: str) -> Stock:
         return get_stock(sym)
@@ -242,17 +411,8 @@ def get_portfolio(user_id: str) -> Portfolio:
     port = Portfolio()
     state = db.get_portfolio_state(user_id)
     if state:
-        # Prefetch all position stocks in parallel (was sequential, now ~5x faster)
-        symbols = [str(p.get("symbol", "")).upper() for p in state.get("positions", []) if p.get("symbol")]
-        if symbols:
-            max_w = min(8, len(symbols))
-            with ThreadPoolExecutor(max_workers=max_w) as ex:
-                futures = {ex.submit(get_stock, s): s for s in symbols}
-                for fut in as_completed(futures):
-                    try:
-                        fut.result()
-                    except Exception:
-                        pass
+        # Load all position stocks with one batched download instead of one request per symbol
+        prefetch_stocks([str(p.get("symbol", "")).upper() for p in state.get("positions", []) if p.get("symbol")])
         port.restore_from_state(
             cash=state["cash"],
             positions_data=state["positions"],
@@ -264,6 +424,12 @@ def get_portfolio(user_id: str) -> Portfolio:
     else:
         port.add_cash(settings["initial_cash"])
 
+    _configure_portfolio(port, settings)
+    return port
+
+
+def _configure_portfolio(port: Portfolio, settings: dict) -> None:
+    """Apply trading costs, shorting rules and constraints from user settings."""
     port.set_slippage(settings.get("slippage", 0.0) or 0.0)
     port.set_share_min_pct(settings.get("share_min_pct", 10))
     port.set_commission(settings.get("commission", 0.0) or 0.0)
@@ -272,6 +438,15 @@ def get_portfolio(user_id: str) -> Portfolio:
     port.set_allow_short(bool(settings.get("allow_short", True)))
     port.set_short_margin_requirement(settings.get("short_margin_requirement", 1.5) or 1.5)
     _apply_portfolio_constraints(port, settings)
+
+
+def _build_backtest_portfolio(settings: dict, cash: float) -> Portfolio:
+    """Fresh configured Portfolio for one backtest phase (fills at next open, equity recorded per bar)."""
+    port = Portfolio()
+    port.add_cash(cash)
+    _configure_portfolio(port, settings)
+    port.fill_at_next_open = True
+    port.record_equity_per_bar = True
     return port
 
 
@@ -287,8 +462,27 @@ def _apply_portfolio_constraints(port: Portfolio, settings: dict) -> None:
     )
 
 
+# Process pool for per-symbol backtests, created on first use. Spawned workers import this module
+# once and then stay warm; the Stock is pickled to them so they never download.
+_strategy_pool: Optional[ProcessPoolExecutor] = None
+_strategy_pool_lock = Lock()
+
+
+def _get_strategy_pool() -> Optional[ProcessPoolExecutor]:
+    global _strategy_pool
+    if STRATEGY_PROCESS_WORKERS < 1:
+        return None
+    with _strategy_pool_lock:
+        if _strategy_pool is None:
+            _strategy_pool = ProcessPoolExecutor(
+                max_workers=STRATEGY_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _strategy_pool
+
+
 def _run_backtest_single_symbol(
-    symbol: str,
+    stock: Stock,
     strat: dict,
     settings: dict,
     cash_per_symbol: float,
@@ -298,22 +492,11 @@ def _run_backtest_single_symbol(
     test_start: Optional[str],
     auto_liquidate: bool,
 ) -> dict:
-    """Run backtest for one symbol. Returns result dict or error."""
+    """Run backtest for one symbol (in a pool worker; arguments and result are pickled). Returns result dict or error."""
+    symbol = stock.symbol
     try:
-        port = Portfolio()
-        port.add_cash(cash_per_symbol)
-        port.set_slippage(settings.get("slippage", 0.0) or 0.0)
-        port.set_share_min_pct(settings.get("share_min_pct", 10))
-        port.set_commission(settings.get("commission", 0.0) or 0.0)
-        port.set_commission_per_order(settings.get("commission_per_order", 0.0) or 0.0)
-        port.set_commission_per_share(settings.get("commission_per_share", 0.0) or 0.0)
-        port.set_allow_short(bool(settings.get("allow_short", True)))
-        port.set_short_margin_requirement(settings.get("short_margin_requirement", 1.5) or 1.5)
-        _apply_portfolio_constraints(port, settings)
-        port.fill_at_next_open = True
-        port.record_equity_per_bar = True
+        port = _build_backtest_portfolio(settings, cash_per_symbol)
 
-        stock = get_stock(symbol)
         block_lookahead = bool(settings.get("block_lookahead", True))
         strategy_obj = create_strategy_from_code(stock, port, strat["code"], block_lookahead=block_lookahead)
         bt = Backtest(strategy_obj, port)
@@ -328,18 +511,7 @@ def _run_backtest_single_symbol(
                 equity_curve=[{"i": 0, "v": cash_per_symbol, "time": start_date}] + train_ec,
                 initial_cash=cash_per_symbol,
             )
-            port = Portfolio()
-            port.add_cash(cash_per_symbol)
-            port.set_slippage(settings.get("slippage", 0.0) or 0.0)
-            port.set_share_min_pct(settings.get("share_min_pct", 10))
-            port.set_commission(settings.get("commission", 0.0) or 0.0)
-            port.set_commission_per_order(settings.get("commission_per_order", 0.0) or 0.0)
-            port.set_commission_per_share(settings.get("commission_per_share", 0.0) or 0.0)
-            port.set_allow_short(bool(settings.get("allow_short", True)))
-            port.set_short_margin_requirement(settings.get("short_margin_requirement", 1.5) or 1.5)
-            _apply_portfolio_constraints(port, settings)
-            port.fill_at_next_open = True
-            port.record_equity_per_bar = True
+            port = _build_backtest_portfolio(settings, cash_per_symbol)
             strategy_obj = create_strategy_from_code(stock, port, strat["code"], block_lookahead=block_lookahead)
             bt = Backtest(strategy_obj, port)
             bt.run(test_start, end_date)
@@ -381,8 +553,9 @@ def _run_backtest_single_symbol(
         return {"ok": False, "symbol": symbol, "error": _safe_error_message(e)}
 
 
-def save_portfolio(user_id: str, port: Portfolio, settings: dict):
-    """Persist portfolio state to db."""
+def save_portfolio(user_id: str, port: Portfolio, settings: dict, save_settings: bool = False):
+    """Persist portfolio state to db in one statement (positions, trade log and equity curve go as whole lists).
+    Mutating endpoints call this at most once. save_settings=True writes settings in the same transaction."""
     db.save_portfolio_state(
         user_id=user_id,
         cash=port.cash,
@@ -390,6 +563,7 @@ def save_portfolio(user_id: str, port: Portfolio, settings: dict):
         trade_log=port.trade_log,
         equity_curve=port.equity_curve,
         realized=port._realized,
+        settings=settings if save_settings else None,
     )
 
 
@@ -400,14 +574,6 @@ class SearchResult(BaseModel):
     type: str
 
 
-class Candle(BaseModel):
-    time: str
-    open: float
-    high: float
-    low: float
-    close: float
-
-
 class Position(BaseModel):
     symbol: str
     quantity: float
@@ -430,21 +596,28 @@ class ClosePositionRequest(BaseModel):
     quantity: float
 
 
+NonNegFloat = Annotated[float, Field(ge=0)]
+NonNegInt = Annotated[int, Field(ge=0)]
+Fraction = Annotated[float, Field(ge=0, lt=1)]
+UnitInterval = Annotated[float, Field(ge=0, le=1)]
+
+
 class SettingsUpdate(BaseModel):
-    initial_cash: Optional[float] = None
-    slippage: Optional[float] = None
-    share_min_pct: Optional[float] = None
-    commission: Optional[float] = None
-    commission_per_order: Optional[float] = None
-    commission_per_share: Optional[float] = None
+    """Partial settings update; ranges are enforced at parse time (422 on violation)."""
+    initial_cash: Optional[Annotated[float, Field(ge=0, le=MAX_INITIAL_CASH)]] = None
+    slippage: Optional[Fraction] = None
+    share_min_pct: Optional[Annotated[float, Field(gt=0, le=100)]] = None
+    commission: Optional[Fraction] = None
+    commission_per_order: Optional[NonNegFloat] = None
+    commission_per_share: Optional[NonNegFloat] = None
     allow_short: Optional[bool] = None
-    max_positions: Optional[int] = None
-    max_position_pct: Optional[float] = None
-    min_cash_reserve_pct: Optional[float] = None
-    min_trade_value: Optional[float] = None
-    max_trade_value: Optional[float] = None
-    max_order_qty: Optional[int] = None
-    short_margin_requirement: Optional[float] = None
+    max_positions: Optional[NonNegInt] = None
+    max_position_pct: Optional[UnitInterval] = None
+    min_cash_reserve_pct: Optional[UnitInterval] = None
+    min_trade_value: Optional[NonNegFloat] = None
+    max_trade_value: Optional[NonNegFloat] = None
+    max_order_qty: Optional[NonNegInt] = None
+    short_margin_requirement: Optional[Annotated[float, Field(ge=1, le=3)]] = None
     auto_liquidate_end: Optional[bool] = None
     block_lookahead: Optional[bool] = None
 
@@ -481,7 +654,7 @@ class MonteCarloRequest(BaseModel):
 # --- Endpoints ---
 
 @app.get("/health")
-def health():
+async def health():
     """Health check for load balancers and monitoring."""
     return {"status": "ok", "service": "acemarket-api"}
 
@@ -498,54 +671,63 @@ def search_stocks(q: str, user_id: str = Depends(verify_token)):
 
 
 @app.get("/api/v1/stock/{symbol}")
-def get_stock_data(
+async def get_stock_data(
     symbol: str,
     user_id: str = Depends(verify_token),
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     limit: int = Query(5000, ge=1, le=10000),
 ) -> dict:
-    """Get OHLC data for charting. Cached 5 min to avoid repeated Yahoo fetches."""
+    """Get OHLC data for charting. Cached 5 min to avoid repeated Yahoo fetches. Cache hits never leave the event loop."""
     symbol = _validate_symbol(symbol)
     start_date = _validate_date_str(start_date) if start_date else None
     end_date = _validate_date_str(end_date) if end_date else None
     cache_key = f"{symbol}|{start_date or ''}|{end_date or ''}|{limit}"
-    now = time.time()
     with _chart_cache_lock:
-        if cache_key in _chart_cache:
-            entry = _chart_cache[cache_key]
-            if now - float(entry.get("ts", 0)) < CHART_CACHE_TTL:
-                return entry["data"]
-        expired = [k for k, v in _chart_cache.items() if now - float(v.get("ts", 0)) > CHART_CACHE_TTL]
-        for k in expired:
-            _chart_cache.pop(k, None)
-
-    stock = Stock(symbol, start_date=start_date, end_date=end_date)
-    df = stock.df
-    if df.empty:
-        raise HTTPException(status_code=404, detail=f"No data for {symbol}")
+        data = _chart_cache.get(cache_key)
+    if data is not None:
+        return data
+
+    data = await asyncio.to_thread(_build_chart_data, symbol, start_date, end_date, limit)
+    with _chart_cache_lock:
+        _chart_cache[cache_key] = data
+    return data
+
+
+def _starts_before_cached_history(stock: Stock, start_date: str) -> bool:
+    """True if start_date is before both the default history window and the cached Stock's first bar
+    (a symbol listed inside the window has nothing older to fetch)."""
+    ts = pd.Timestamp(start_date)
+    first = stock._index_i8[0] if stock._n_bars else None
+    return ts < pd.Timestamp(default_date_range(None, None)[0]) and (first is None or ts.value < first)
+
 
-    df = df.tail(limit)
+def _build_chart_data(symbol: str, start_date: Optional[str], end_date: Optional[str], limit: int) -> dict:
+    """Slice chart data out of the shared full-history Stock (blocking on a cache miss; run off the event loop)."""
+    stock = get_stock(symbol)
+    if start_date and _starts_before_cached_history(stock, start_date):
+        # Older than the default window the cache holds: fetch exactly the requested range instead.
+        stock = Stock(symbol, start_date, end_date)
+    # Fuse start/end/limit into one positional slice. end_date stays exclusive, as it was for the Yahoo download.
+    idx = stock._index_i8
+    lo = int(np.searchsorted(idx, pd.Timestamp(start_date).value, side="left")) if start_date else 0
+    hi = int(np.searchsorted(idx, pd.Timestamp(end_date).value, side="left")) if end_date else len(idx)
+    lo = max(lo, hi - limit)
+    if lo >= hi:
+        raise HTTPException(status_code=404, detail=f"No data for {symbol}")
+    df = stock.df.iloc[lo:hi]
 
-    times = [idx.isoformat()[:10] for idx in df.index]
-    opens = df["Open"].astype(float).tolist()
-    highs = df["High"].astype(float).tolist()
-    lows = df["Low"].astype(float).tolist()
-    closes = df["Close"].astype(float).tolist()
-    candles = [Candle(time=t, open=o, high=h, low=l, close=c) for t, o, h, l, c in zip(times, opens, highs, lows, closes)]
-    data = {
+    # Plain dicts straight from the frame: no per-row model construction on the hot path.
+    sub = df[["Open", "High", "Low", "Close"]].astype("float64").rename(columns=str.lower)
+    sub.insert(0, "time", df.index.strftime("%Y-%m-%d"))
+    candles = sub.to_dict(orient="records")
+    return {
         "symbol": stock.symbol,
         "candles": candles,
-        "sma": stock.sma(14)[-len(candles):],
-        "ema": stock.ema(14)[-len(candles):],
-        "rsi": stock.rsi(14)[-len(candles):],
+        "sma": nan_to_none(stock._sma_array(14)[lo:hi]),
+        "ema": nan_to_none(stock._ema_array(14)[lo:hi]),
+        "rsi": nan_to_none(stock._rsi_array(14)[lo:hi]),
     }
-    with _chart_cache_lock:
-        if len(_chart_cache) >= CHART_CACHE_MAX:
-            lru = min(_chart_cache.items(), key=lambda kv: float(kv[1].get("ts", 0)))[0]
-            _chart_cache.pop(lru, None)
-        _chart_cache[cache_key] = {"ts": now, "data": data}
-    return data
 
 
 @app.get("/api/v1/stock/{symbol}/price")
@@ -582,16 +764,15 @@ def update_watchlist(req: WatchlistUpdate, user_id: str = Depends(verify_token))
             validated.append(_validate_symbol(str(s).strip()))
         except HTTPException:
             raise
-    settings = db.get_settings(user_id)
-    settings["watchlist"] = validated
-    db.save_settings(user_id, settings)
+    db.merge_settings(user_id, {"watchlist": validated})
     return {"watchlist": validated}
 
 
-def _get_quote_for_symbol(sym: str) -> dict:
-    """Fetch quote for one symbol. Used by parallel quote fetcher."""
+def _get_quote_for_symbol(sym: str, stock: Optional[Stock] = None) -> dict:
+    """Fetch quote for one symbol (from stock when the caller already holds it). Used by parallel quote fetcher."""
     try:
-        stock = get_stock(sym)
+        if stock is None:
+            stock = get_stock(sym)
         price = float(stock.price())
         prev_close = float(stock.df["Close"].iloc[-2]) if len(stock.df) >= 2 else price
         change = price - prev_close
@@ -605,60 +786,60 @@ def _get_quote_for_symbol(sym: str) -> dict:
 
 
 @app.get("/api/v1/watchlist/quotes")
-def get_watchlist_quotes(symbols: str, user_id: str = Depends(verify_token)) -> list[dict]:
-    """Get price and change from previous close for each symbol. Fetches in parallel."""
+async def get_watchlist_quotes(symbols: str, user_id: str = Depends(verify_token)) -> list[dict]:
+    """Get price and change from previous close for each symbol. Cache misses are fetched concurrently."""
     syms = [s.strip().upper() for s in symbols.split(",") if s.strip()][:MAX_WATCHLIST_QUOTES_SYMBOLS]
     if not syms:
         return []
-    result = [None] * len(syms)
-    sym_to_idx = {s: i for i, s in enumerate(syms)}
-    max_workers = min(8, len(syms))
-    with ThreadPoolExecutor(max_workers=max_workers) as ex:
-        futures = {ex.submit(_get_quote_for_symbol, s): s for s in syms}
-        for fut in as_completed(futures):
-            sym = futures[fut]
-            try:
-                q = fut.result()
-                result[sym_to_idx[sym]] = q
-            except HTTPException:
-                raise
-            except Exception:
-                result[sym_to_idx[sym]] = {"symbol": sym, "price": None, "prev_close": None, "change": None, "change_pct": None}
-    return [r for r in result if r is not None]
+    if not all(_cached_stock(s) is not None for s in syms):
+        await asyncio.to_thread(prefetch_stocks, syms)
+
+    async def fetch(sym: str) -> dict:
+        # Cached symbols are quoted with a few array reads, no need for a worker thread. The quote uses the
+        # Stock from this one lookup, so an entry expiring in between cannot trigger a download on the loop.
+        stock = _cached_stock(sym)
+        if stock is not None:
+            return _get_quote_for_symbol(sym, stock)
+        return await asyncio.to_thread(_get_quote_for_symbol, sym)
+
+    return list(await asyncio.gather(*(fetch(s) for s in syms)))
 
 
 @app.get("/api/v1/portfolio")
-def get_portfolio_state(user_id: str = Depends(verify_token)) -> dict:
-    """Get portfolio positions and value."""
-    port = get_portfolio(user_id)
-    settings = db.get_settings(user_id)
+async def get_portfolio_state(user_id: str = Depends(verify_token), settings: dict = Depends(settings_dep)) -> dict:
+    """Get portfolio positions and value. Loading, pricing and the metrics report all run in a worker thread."""
+    return await asyncio.to_thread(_build_portfolio_state, user_id, settings)
+
+
+def _build_portfolio_state(user_id: str, settings: dict) -> dict:
+    """Blocking body of get_portfolio_state: DB read, stock loads, position pricing and compute_report."""
+    port = get_portfolio(user_id, settings)
     initial = settings["initial_cash"]
 
-    positions = []
-    for p in port.positions():
-        stock = p["stock"]
-        quantity = float(p["quantity"])
-        symbol = stock.symbol
-        price = float(stock.price())
-        avg_price = float(p.get("avg_price") or 0.0)
-        realized_pnl = float(p.get("realized_pnl") or 0.0)
-        if quantity > 0:
-            pnl = (price - avg_price) * quantity
-        else:
-            pnl = (avg_price - price) * abs(quantity)
-        pnl_pct = (pnl / (avg_price * abs(quantity)) * 100) if avg_price and abs(quantity) else 0.0
-        positions.append(
-            Position(
-                symbol=symbol,
-                quantity=abs(quantity),
-                side="long" if quantity > 0 else "short",
-                avg_price=avg_price,
-                current_price=price,
-                pnl=pnl,
-                pnl_pct=pnl_pct,
-                realized_pnl=realized_pnl,
-            )
+    # Price and P&L every position in one vectorized pass over the cached close arrays.
+    pos_list = port.positions()
+    n = len(pos_list)
+    prices = np.fromiter((p["stock"].price() for p in pos_list), dtype=np.float64, count=n)
+    qtys = np.fromiter((float(p["quantity"]) for p in pos_list), dtype=np.float64, count=n)
+    avgs = np.fromiter((float(p.get("avg_price") or 0.0) for p in pos_list), dtype=np.float64, count=n)
+    abs_qtys = np.abs(qtys)
+    pnl = np.where(qtys > 0, (prices - avgs) * qtys, (avgs - prices) * abs_qtys)
+    pnl_pct = np.divide(pnl, avgs * abs_qtys, out=np.zeros(n), where=(avgs != 0) & (abs_qtys != 0)) * 100
+    positions = [
+        Position(
+            symbol=p["stock"].symbol,
+            quantity=q,
+            side="long" if signed > 0 else "short",
+            avg_price=avg,
+            current_price=price,
+            pnl=pl,
+            pnl_pct=pct,
+            realized_pnl=float(p.get("realized_pnl") or 0.0),
+        )
+        for p, signed, q, avg, price, pl, pct in zip(
+            pos_list, qtys.tolist(), abs_qtys.tolist(), avgs.tolist(), prices.tolist(), pnl.tolist(), pnl_pct.tolist()
         )
+    ]
 
     value = port.get_value()
     trade_log = port.trade_log
@@ -666,13 +847,12 @@ def get_portfolio_state(user_id: str = Depends(verify_token)) -> dict:
     if not equity_curve or abs(equity_curve[-1]["v"] - value) > 0.01:
         equity_curve.append({"i": max(1, len(port.trade_log)), "v": value})
 
-    equity_curve_enriched = []
-    for pt in equity_curve:
-        q = dict(pt)
-        i = q.get("i")
-        if isinstance(i, int) and i > 0 and i - 1 < len(trade_log):
-            q["time"] = trade_log[i - 1].get("time")
-        equity_curve_enriched.append(q)
+    # Points after a trade take that trade's time; others are passed through as-is (not copied).
+    n_trades = len(trade_log)
+    equity_curve_enriched = [
+        {**pt, "time": trade_log[i - 1].get("time")} if isinstance(i := pt.get("i"), int) and 0 < i <= n_trades else pt
+        for pt in equity_curve
+    ]
 
     metrics = compute_report(trade_log=trade_log, equity_curve=equity_curve_enriched, initial_cash=initial)
     # Do not save on read; portfolio is persisted only on mutations (open/close/clear/settings)
@@ -692,7 +872,7 @@ def get_portfolio_state(user_id: str = Depends(verify_token)) -> dict:
 
 
 @app.post("/api/v1/portfolio/position")
-def open_position(req: OpenPositionRequest, user_id: str = Depends(verify_token)):
+def open_position(req: OpenPositionRequest, user_id: str = Depends(verify_token), settings: dict = Depends(settings_dep)):
     """Open a long or short position."""
     if req.quantity <= 0:
         raise HTTPException(status_code=400, detail="Quantity must be positive")
@@ -701,8 +881,7 @@ def open_position(req: OpenPositionRequest, user_id: str = Depends(verify_token)
     if req.side not in ("long", "short"):
         raise HTTPException(status_code=400, detail="Side must be 'long' or 'short'")
     stock = get_stock(req.symbol)
-    port = get_portfolio(user_id)
-    settings = db.get_settings(user_id)
+    port = get_portfolio(user_id, settings)
     try:
         if req.side == "long":
             port.enter_position_long(stock, req.quantity)
@@ -715,10 +894,9 @@ def open_position(req: OpenPositionRequest, user_id: str = Depends(verify_token)
 
 
 @app.post("/api/v1/portfolio/clear")
-def clear_history(user_id: str = Depends(verify_token)):
+def clear_history(user_id: str = Depends(verify_token), settings: dict = Depends(settings_dep)):
     """Reset portfolio: clear all positions and trade history."""
-    port = get_portfolio(user_id)
-    settings = db.get_settings(user_id)
+    port = get_portfolio(user_id, settings)
     port.clear_history(settings["initial_cash"])
     save_portfolio(user_id, port, settings)
     return {"ok": True, "message": "History cleared"}
@@ -726,15 +904,14 @@ def clear_history(user_id: str = Depends(verify_token)):
 
 @app.delete("/api/v1/portfolio/position")
 @app.post("/api/v1/portfolio/position/close")
-def close_position(req: ClosePositionRequest, user_id: str = Depends(verify_token)):
+def close_position(req: ClosePositionRequest, user_id: str = Depends(verify_token), settings: dict = Depends(settings_dep)):
     """Close (part of) a position."""
     if req.quantity <= 0:
         raise HTTPException(status_code=400, detail="Quantity must be positive")
     if req.quantity > MAX_ORDER_QUANTITY:
         raise HTTPException(status_code=400, detail=f"Quantity exceeds maximum ({MAX_ORDER_QUANTITY:,})")
     stock = get_stock(req.symbol)
-    port = get_portfolio(user_id)
-    settings = db.get_settings(user_id)
+    port = get_portfolio(user_id, settings)
     try:
         port.exit_position(stock, req.quantity)
     except ValueError as e:
@@ -744,8 +921,8 @@ def close_position(req: ClosePositionRequest, user_id: str = Depends(verify_toke
 
 
 @app.get("/api/v1/settings")
-def get_settings_endpoint(user_id: str = Depends(verify_token)) -> dict:
-    return db.get_settings(user_id)
+def get_settings_endpoint(settings: dict = Depends(settings_dep)) -> dict:
+    return settings
 
 
 @app.get("/api/v1/strategies")
@@ -753,8 +930,20 @@ def get_strategies_endpoint(user_id: str = Depends(verify_token)):
     return {"strategies": db.get_strategies(user_id)}
 
 
+def _check_strategy_code(code: str, settings: dict) -> None:
+    """Compile and instantiate user code against a 2-bar stock (no download). Raises HTTPException(400) if invalid."""
+    try:
+        stock = make_minimal_stock("AAPL")  # fresh per call: user __init__ code may mutate its stock
+        port = Portfolio()
+        port.add_cash(1000)
+        create_strategy_from_code(stock, port, code, block_lookahead=bool(settings.get("block_lookahead", True)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=_safe_error_message(e))
+
+
 @app.post("/api/v1/strategies")
-def create_strategy_endpoint(req: StrategyCreate, user_id: str = Depends(verify_token)):
+async def create_strategy_endpoint(req: StrategyCreate, user_id: str = Depends(verify_token), settings: dict = Depends(settings_dep)):
+    """Validation exec and db calls run in worker threads; exec is bounded by STRATEGY_EXEC_TIMEOUT."""
     if not req.name or not req.name.strip():
         raise HTTPException(status_code=400, detail="Strategy name cannot be empty")
     if len((req.name or "").strip()) > STRATEGY_NAME_MAX_LEN:
@@ -764,50 +953,47 @@ def create_strategy_endpoint(req: StrategyCreate, user_id: str = Depends(verify_
     if len(req.code) > STRATEGY_CODE_MAX_LEN:
         raise HTTPException(status_code=400, detail=f"Strategy code exceeds maximum length ({STRATEGY_CODE_MAX_LEN})")
     name = req.name.strip()
-    existing = next((s for s in db.get_strategies(user_id) if s["name"].lower() == name.lower()), None)
+    strategies = await asyncio.to_thread(db.get_strategies, user_id)
+    existing = next((s for s in strategies if s["name"].lower() == name.lower()), None)
     if existing:
         raise HTTPException(status_code=400, detail=f"Strategy '{name}' already exists")
-    settings = db.get_settings(user_id)
-    block_lookahead = bool(settings.get("block_lookahead", True))
-    try:
-        stock = make_minimal_stock("AAPL")
-        port = Portfolio()
-        port.add_cash(1000)
-        create_strategy_from_code(stock, port, req.code, block_lookahead=block_lookahead)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=_safe_error_message(e))
-    strat = db.create_strategy(user_id, name, req.code)
+    await asyncio.to_thread(_check_strategy_code, req.code, settings)
+    strat = await asyncio.to_thread(db.create_strategy, user_id, name, req.code)
     return {"ok": True, "strategy": strat}
 
 
 @app.put("/api/v1/strategies/{strategy_id}")
-def update_strategy_endpoint(strategy_id: str, upd: StrategyUpdate, user_id: str = Depends(verify_token)):
-    strat = db.get_strategy(user_id, strategy_id)
-    if not strat:
-        raise HTTPException(status_code=404, detail="Strategy not found")
+async def update_strategy_endpoint(
+    strategy_id: str,
+    upd: StrategyUpdate,
+    user_id: str = Depends(verify_token),
+    settings: dict = Depends(settings_dep),
+):
+    code = upd.code
+    if code is None:
+        # Name-only update: the stored code is re-checked against the current settings
+        strat = await asyncio.to_thread(db.get_strategy, user_id, strategy_id)
+        if not strat:
+            raise HTTPException(status_code=404, detail="Strategy not found")
+        code = strat["code"]
     if upd.name is not None:
         n = upd.name.strip()
         if not n:
             raise HTTPException(status_code=400, detail="Strategy name cannot be empty")
         if len(n) > STRATEGY_NAME_MAX_LEN:
             raise HTTPException(status_code=400, detail=f"Strategy name too long (max {STRATEGY_NAME_MAX_LEN} characters)")
-        other = next((s for s in db.get_strategies(user_id) if s["id"] != strategy_id and s["name"].lower() == n.lower()), None)
+        strategies = await asyncio.to_thread(db.get_strategies, user_id)
+        other = next((s for s in strategies if s["id"] != strategy_id and s["name"].lower() == n.lower()), None)
         if other:
             raise HTTPException(status_code=400, detail=f"Strategy '{n}' already exists")
     if upd.code is not None and not upd.code.strip():
         raise HTTPException(status_code=400, detail="Strategy code cannot be empty")
     if upd.code is not None and len(upd.code) > STRATEGY_CODE_MAX_LEN:
         raise HTTPException(status_code=400, detail=f"Strategy code exceeds maximum length ({STRATEGY_CODE_MAX_LEN})")
-    settings = db.get_settings(user_id)
-    block_lookahead = bool(settings.get("block_lookahead", True))
-    try:
-        stock = make_minimal_stock("AAPL")
-        port = Portfolio()
-        port.add_cash(1000)
-        create_strategy_from_code(stock, port, upd.code if upd.code is not None else strat["code"], block_lookahead=block_lookahead)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=_safe_error_message(e))
-    updated = db.update_strategy(user_id, strategy_id, upd.name, upd.code)
+    await asyncio.to_thread(_check_strategy_code, code, settings)
+    updated = await asyncio.to_thread(db.update_strategy, user_id, strategy_id, upd.name, upd.code)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Strategy not found")
     return {"ok": True, "strategy": updated}
 
 
@@ -844,26 +1030,34 @@ def _run_backtest_background(job_id: str, user_id: str, req: RunStrategyRequest)
         else:
             train_end, test_start = None, None
         auto_liquidate = bool(settings.get("auto_liquidate_end", True))
-        max_workers = min(8, max(1, len(symbols)))
+        prefetch_stocks(symbols)
         symbol_to_result: dict[str, dict] = {}
-        with ThreadPoolExecutor(max_workers=max_workers) as ex:
-            futures = {
-                ex.submit(
+        futures = {}
+        pool = _get_strategy_pool()
+        ex: Executor = pool if pool is not None else ThreadPoolExecutor(max_workers=min(8, len(symbols)))
+        try:
+            for symbol in symbols:
+                try:
+                    stock = get_stock(symbol)
+                except Exception as e:
+                    symbol_to_result[symbol] = {"ok": False, "symbol": symbol, "error": _safe_error_message(e)}
+                    continue
+                fut = ex.submit(
                     _run_backtest_single_symbol,
-                    symbol, strat, settings, cash_per_symbol,
+                    stock, strat, settings, cash_per_symbol,
                     req.start_date, req.end_date, train_end, test_start, auto_liquidate,
-                ): symbol
-                for symbol in symbols
-            }
+                )
+                futures[fut] = symbol
             for fut in as_completed(futures):
                 symbol = futures[fut]
                 try:
                     symbol_to_result[symbol] = fut.result()
-                except HTTPException:
-                    raise
                 except Exception as e:
                     logger.warning("Strategy run failed for %s: %s", symbol, e)
                     symbol_to_result[symbol] = {"ok": False, "symbol": symbol, "error": _safe_error_message(e)}
+        finally:
+            if ex is not pool:
+                ex.shutdown()
         results = []
         combined_trade_log = []
         portfolio_equity_curves = []
@@ -909,23 +1103,29 @@ def _run_backtest_background(job_id: str, user_id: str, req: RunStrategyRequest)
                 if equity_curve_enriched[-1].get("time") is None:
                     equity_curve_enriched[-1]["time"] = req.end_date
         else:
-            events = []
+            # Each symbol's events are already in time order (the sort is a linear pass), so a k-way
+            # heap merge replaces sorting all events; the portfolio total is kept as a running sum.
+            streams = []
             for pidx, (ec, tl) in enumerate(portfolio_equity_curves):
+                stream = []
                 for j, pt in enumerate(ec):
                     t = pt.get("time")
                     if t is None:
                         t = req.start_date if j == 0 else (tl[j - 1]["time"] if j - 1 < len(tl) and tl[j - 1].get("time") else None)
                     if t:
-                        events.append((t, pidx, float(pt.get("v") or 0)))
-            events.sort(key=lambda x: (x[0], x[1]))
+                        stream.append((t, pidx, float(pt.get("v") or 0)))
+                stream.sort(key=lambda x: x[0])
+                streams.append(stream)
             current = [float(ec[0].get("v") or 0) if ec else 0 for ec, _ in portfolio_equity_curves]
+            total = sum(current)
             equity_curve_enriched = [{"i": 0, "v": initial, "time": None}]
-            seen_times = set()
-            for t, pidx, v in events:
+            last_t = None
+            for t, pidx, v in heapq.merge(*streams, key=lambda x: (x[0], x[1])):
+                total += v - current[pidx]
                 current[pidx] = v
-                if t not in seen_times:
-                    seen_times.add(t)
-                    equity_curve_enriched.append({"i": len(equity_curve_enriched), "v": sum(current), "time": t})
+                if t != last_t:
+                    last_t = t
+                    equity_curve_enriched.append({"i": len(equity_curve_enriched), "v": total, "time": t})
 
         metrics = compute_report(trade_log=combined_trade_log, equity_curve=equity_curve_enriched, initial_cash=initial)
         run_data = _to_native({
@@ -1021,6 +1221,7 @@ def _run_montecarlo_background(job_id: str, user_id: str, req: MonteCarloRequest
             n_sims=n_sims,
             horizon=horizon,
             block_lookahead=block_lookahead,
+            executor=_get_strategy_pool(),  # None unless STRATEGY_PROCESS_WORKERS is set: threads in-process
         )
         initial = result["initial_cash"]
         mean_val = result["mean"]
@@ -1106,23 +1307,22 @@ def _reconstruct_equity_curve_from_trades(trade_log: list, initial_cash: float,
     """Reconstruct equity curve from trade_log when stored curve has only 2 points (legacy runs)."""
     if not trade_log:
         return [{"i": 0, "v": initial_cash, "time": start_date}, {"i": 1, "v": initial_cash, "time": end_date}]
+    # One pass to pull columns, then running cash/position as cumulative sums (same order as a sequential loop).
+    typ = np.array([(t.get("type") or "").lower() for t in trade_log])
+    qty = np.array([float(t.get("quantity") or 0) for t in trade_log])
+    price = np.array([float(t.get("price") or t.get("fill_price") or 0) for t in trade_log])
+    cost = np.array([float(t.get("cost") or 0) for t in trade_log])
+    amount = np.array([float(t.get("amount") or 0) for t in trade_log])
+    is_long, is_exit = typ == "long", typ == "exit"
+    cash_delta = np.where(is_long, -cost, np.where(is_exit, amount, 0.0))
+    cash = np.cumsum(np.concatenate(([float(initial_cash)], cash_delta)))[1:]
+    position = np.cumsum(np.where(is_long, qty, np.where(is_exit, -qty, 0.0)))
+    value = np.where(position != 0, cash + position * price, cash)
     curve = [{"i": 0, "v": initial_cash, "time": start_date}]
-    cash = float(initial_cash)
-    position = 0
-    for i, t in enumerate(trade_log):
-        qty = float(t.get("quantity") or 0)
-        price = float(t.get("price") or t.get("fill_price") or 0)
-        typ = (t.get("type") or "").lower()
-        if typ == "long":
-            cost = float(t.get("cost") or 0)
-            cash -= cost
-            position += qty
-        elif typ == "exit":
-            amount = float(t.get("amount") or 0)
-            cash += amount
-            position -= qty
-        value = cash + position * price if position else cash
-        curve.append({"i": i + 1, "v": value, "time": t.get("time") or end_date})
+    curve.extend(
+        {"i": i + 1, "v": v, "time": t.get("time") or end_date}
+        for i, (t, v) in enumerate(zip(trade_log, value.tolist()))
+    )
     return curve
 
 
@@ -1154,85 +1354,31 @@ def clear_runs_endpoint(user_id: str = Depends(verify_token)):
     return {"ok": True}
 
 
-@app.put("/api/v1/settings")
-def update_settings_endpoint(upd: SettingsUpdate, user_id: str = Depends(verify_token)):
-    settings = db.get_settings(user_id)
-
-    if upd.initial_cash is not None:
-        if upd.initial_cash < 0:
-            raise HTTPException(status_code=400, detail="initial_cash must be >= 0")
-        if upd.initial_cash > MAX_INITIAL_CASH:
-            raise HTTPException(status_code=400, detail=f"initial_cash must be <= {MAX_INITIAL_CASH:,.0f}")
-        settings["initial_cash"] = float(upd.initial_cash)
-        port = get_portfolio(user_id)
-        cur = float(port.get_value())
-        diff = float(upd.initial_cash) - cur
-        if abs(diff) > 0.01:
-            port.add_cash(diff)
-        save_portfolio(user_id, port, settings)
-
-    if upd.share_min_pct is not None:
-        pct = float(upd.share_min_pct)
-        if pct <= 0 or pct > 100:
-            raise HTTPException(status_code=400, detail="share_min_pct must be 1–100 (e.g. 10 = 0.1 share min)")
-        settings["share_min_pct"] = pct
-    if upd.slippage is not None:
-        if upd.slippage < 0 or upd.slippage >= 1:
-            raise HTTPException(status_code=400, detail="slippage must be in [0, 1) as decimal (e.g. 0.001 = 0.1%%)")
-        settings["slippage"] = float(upd.slippage)
-    if upd.commission is not None:
-        if upd.commission < 0 or upd.commission >= 1:
-            raise HTTPException(status_code=400, detail="commission must be in [0, 1) as decimal (e.g. 0.001 = 0.1%%)")
-        settings["commission"] = float(upd.commission)
-    if upd.commission_per_order is not None:
-        if upd.commission_per_order < 0:
-            raise HTTPException(status_code=400, detail="commission_per_order must be >= 0")
-        settings["commission_per_order"] = float(upd.commission_per_order)
-    if upd.commission_per_share is not None:
-        if upd.commission_per_share < 0:
-            raise HTTPException(status_code=400, detail="commission_per_share must be >= 0")
-        settings["commission_per_share"] = float(upd.commission_per_share)
-
-    if upd.allow_short is not None:
-        settings["allow_short"] = bool(upd.allow_short)
-    if upd.max_positions is not None:
-        if upd.max_positions < 0:
-            raise HTTPException(status_code=400, detail="max_positions must be >= 0")
-        settings["max_positions"] = int(upd.max_positions)
-    if upd.max_position_pct is not None:
-        if upd.max_position_pct < 0 or upd.max_position_pct > 1:
-            raise HTTPException(status_code=400, detail="max_position_pct must be in [0, 1]")
-        settings["max_position_pct"] = float(upd.max_position_pct)
-    if upd.min_cash_reserve_pct is not None:
-        if upd.min_cash_reserve_pct < 0 or upd.min_cash_reserve_pct > 1:
-            raise HTTPException(status_code=400, detail="min_cash_reserve_pct must be in [0, 1]")
-        settings["min_cash_reserve_pct"] = float(upd.min_cash_reserve_pct)
-    if upd.min_trade_value is not None:
-        if upd.min_trade_value < 0:
-            raise HTTPException(status_code=400, detail="min_trade_value must be >= 0")
-        settings["min_trade_value"] = float(upd.min_trade_value)
-    if upd.max_trade_value is not None:
-        if upd.max_trade_value < 0:
-            raise HTTPException(status_code=400, detail="max_trade_value must be >= 0")
-        settings["max_trade_value"] = float(upd.max_trade_value)
-    if upd.max_order_qty is not None:
-        if upd.max_order_qty < 0:
-            raise HTTPException(status_code=400, detail="max_order_qty must be >= 0")
-        settings["max_order_qty"] = int(upd.max_order_qty)
-    if upd.short_margin_requirement is not None:
-        if upd.short_margin_requirement < 1 or upd.short_margin_requirement > 3:
-            raise HTTPException(status_code=400, detail="short_margin_requirement must be in [1, 3]")
-        settings["short_margin_requirement"] = float(upd.short_margin_requirement)
-    if upd.auto_liquidate_end is not None:
-        settings["auto_liquidate_end"] = bool(upd.auto_liquidate_end)
-    if upd.block_lookahead is not None:
-        settings["block_lookahead"] = bool(upd.block_lookahead)
-
+def _check_trade_value_bounds(settings: dict) -> None:
     if settings.get("max_trade_value", 0.0) and settings.get("min_trade_value", 0.0):
         if float(settings["max_trade_value"]) < float(settings["min_trade_value"]):
             raise HTTPException(status_code=400, detail="max_trade_value must be >= min_trade_value")
 
-    db.save_settings(user_id, settings)
+
+@app.put("/api/v1/settings")
+def update_settings_endpoint(upd: SettingsUpdate, user_id: str = Depends(verify_token)):
+    patch = upd.model_dump(exclude_none=True)
+    if upd.initial_cash is None:
+        # Settings only: one UPSERT merges in SQL. The cross-field check needs the merged row, so only
+        # patches touching the trade-value bounds pay for an explicit transaction around it.
+        touches_bounds = not patch.keys().isdisjoint(("min_trade_value", "max_trade_value"))
+        validate = _check_trade_value_bounds if touches_bounds else None
+        return {"ok": True, "settings": db.merge_settings(user_id, patch, validate=validate)}
+
+    settings = db.get_settings(user_id)
+    settings.update(patch)
+    _check_trade_value_bounds(settings)
+    port = get_portfolio(user_id)
+    diff = float(upd.initial_cash) - float(port.get_value())
+    if abs(diff) > 0.01:
+        port.add_cash(diff)
+    # Validated: write the cash adjustment and the new settings together
+    save_portfolio(user_id, port, settings, save_settings=True)
     return {"ok": True, "settings": settings}
 
 
@@ -1,19 +1,35 @@
 """Firebase API authentication"""
 import base64
+import hashlib
 import json
 import os
 import logging
+import time
+from threading import Lock
 from typing import Optional
 
+from cachetools import TLRUCache
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
 from config import DISABLE_AUTH
 
+try:
+    from firebase_admin import auth as _fb_auth
+except ImportError:
+    _fb_auth = None
+
 logger = logging.getLogger(__name__)
 security = HTTPBearer(auto_error=False)
 _firebase_app = None
 
+# sha256(token) -> (uid, exp). Entries expire with the token itself; verify_id_token does not
+# check revocation, so serving a cached uid until exp accepts exactly the tokens it would.
+_TOKEN_CACHE_MAX = 10_000
+_token_cache = TLRUCache(_TOKEN_CACHE_MAX, ttu=lambda _key, value, _now: value[1], timer=time.time)
+_token_cache_lock = Lock()
+
 
 def _load_credentials_json():
     """Load credentials from FIREBASE_CREDENTIALS_JSON or FIREBASE_CREDENTIALS_BASE64."""
@@ -83,21 +99,28 @@ def verify_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(s
             detail="Invalid token",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    key = hashlib.sha256(token.encode()).digest()
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+    if cached is not None:
+        return cached[0]
+    if _fb_auth is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Firebase Admin SDK not installed. Run: pip install firebase-admin",
+        )
     try:
-        try:
-            from firebase_admin import auth
-        except ImportError:
-            raise HTTPException(
-                status_code=503,
-                detail="Firebase Admin SDK not installed. Run: pip install firebase-admin",
-            ) from None
         _get_firebase_app()
         # Do not pass audience: Firebase ID tokens can have aud = project_id or OAuth client ID.
         # Requiring audience=project_id breaks valid tokens (e.g. from Google Sign-In).
-        decoded = auth.verify_id_token(token)
+        decoded = _fb_auth.verify_id_token(token)
         uid = decoded.get("uid")
         if not uid:
             raise HTTPException(status_code=401, detail="Invalid token payload")
+        exp = decoded.get("exp")
+        if isinstance(exp, (int, float)):
+            with _token_cache_lock:
+                _token_cache[key] = (uid, float(exp))
         return uid
     except Exception as e:
         logger.warning(
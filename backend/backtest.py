@@ -1,9 +1,14 @@
 """Execute user backtest strategy code"""
 import ast
 import builtins
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+import threading
+from functools import lru_cache
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
 
-from strategy import Strategy
+import numpy as np
+import pandas as pd
+
+from strategy import Strategy, collect_subclasses
 
 from config import STRATEGY_CODE_MAX_LEN
 
@@ -34,7 +39,7 @@ STRATEGY_ALLOWED_IMPORT_ROOTS = frozenset(
 
 _REAL_IMPORT = builtins.__import__
 
-_FORBIDDEN_NAMES = {
+_FORBIDDEN_NAMES = frozenset({
     "__builtins__",
     "__import__",
     "eval",
@@ -74,11 +79,13 @@ _FORBIDDEN_NAMES = {
     "__globals__",
     "__code__",
     "__closure__",
-}
+})
 
 # Strategy execution timeout (seconds)
 STRATEGY_EXEC_TIMEOUT = 30
 
+_LOOKAHEAD_ATTRS = frozenset({"df", "iloc", "loc", "iat", "at", "values", "index"})
+
 _ALLOWED_DUNDER_ATTRS = {
     "__init__",
 }
@@ -99,105 +106,127 @@ def _safe_import(name, globals=None, locals=None, fromlist=(), level=0):
     return _REAL_IMPORT(name, globals, locals, fromlist, level)
 
 
-def _validate_strategy_imports(tree: ast.AST) -> None:
-    """Reject imports not on the whitelist (and relative imports) before execution."""
-    allowed_msg = ", ".join(sorted(STRATEGY_ALLOWED_IMPORT_ROOTS))
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Import):
-            for alias in node.names:
-                mod_name = alias.name
-                root = mod_name.split(".", 1)[0]
-                if root not in STRATEGY_ALLOWED_IMPORT_ROOTS:
-                    raise ValueError(
-                        f"Import '{mod_name}' is not allowed. Allowed top-level modules: {allowed_msg}"
-                    )
-        elif isinstance(node, ast.ImportFrom):
-            if node.level != 0:
-                raise ValueError("Relative imports are not allowed in strategy code")
-            if node.module is None:
-                raise ValueError("Relative imports are not allowed in strategy code")
-            root = node.module.split(".", 1)[0]
-            if root not in STRATEGY_ALLOWED_IMPORT_ROOTS:
+_ALLOWED_IMPORTS_MSG = ", ".join(sorted(STRATEGY_ALLOWED_IMPORT_ROOTS))
+
+
+class _StrategyValidator(ast.NodeVisitor):
+    """
+    Single depth-first pass over the strategy AST; the first violation raises ValueError and stops the walk.
+    Leaf-like nodes (Name, imports, global/nonlocal) are not descended into.
+    """
+
+    def __init__(self, *, block_lookahead: bool):
+        # Block look-ahead when enabled: stock.df, .iloc, .loc expose raw data and enable future peeking
+        self.forbidden_attrs = _LOOKAHEAD_ATTRS if block_lookahead else frozenset()
+
+    def visit_Name(self, node: ast.Name) -> None:
+        # Also covers calls: the func of eval(...) is a Name
+        if node.id in _FORBIDDEN_NAMES:
+            raise ValueError(f"Use of '{node.id}' is not allowed in strategy code")
+
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        attr = node.attr
+        if attr in self.forbidden_attrs:
+            raise ValueError(
+                f"[Lookahead blocked] Access to '{attr}' is not allowed. "
+                "Use stock.price(index), stock.get_candle(index), stock.sma(period), etc. "
+                "Only use data at or before the current bar index in update()."
+            )
+        if attr.startswith("__") and attr not in _ALLOWED_DUNDER_ATTRS:
+            raise ValueError("Access to dunder attributes is not allowed")
+        self.visit(node.value)
+
+    def visit_Global(self, node: ast.AST) -> None:
+        raise ValueError("global/nonlocal are not allowed in strategy code")
+
+    visit_Nonlocal = visit_Global
+
+    def visit_Import(self, node: ast.Import) -> None:
+        """Reject imports not on the whitelist (and relative imports) before execution."""
+        for alias in node.names:
+            if alias.name.split(".", 1)[0] not in STRATEGY_ALLOWED_IMPORT_ROOTS:
                 raise ValueError(
-                    f"Import from '{node.module}' is not allowed. Allowed top-level modules: {allowed_msg}"
+                    f"Import '{alias.name}' is not allowed. Allowed top-level modules: {_ALLOWED_IMPORTS_MSG}"
                 )
 
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        if node.level != 0 or node.module is None:
+            raise ValueError("Relative imports are not allowed in strategy code")
+        if node.module.split(".", 1)[0] not in STRATEGY_ALLOWED_IMPORT_ROOTS:
+            raise ValueError(
+                f"Import from '{node.module}' is not allowed. Allowed top-level modules: {_ALLOWED_IMPORTS_MSG}"
+            )
+
 
 def _validate_strategy_code(code: str, *, block_lookahead: bool = True) -> ast.AST:
     try:
         tree = ast.parse(code, mode="exec")
     except SyntaxError as e:
         raise ValueError(f"Syntax error: {e}")
+    _StrategyValidator(block_lookahead=block_lookahead).visit(tree)
+    return tree
 
-    # Block look-ahead when enabled: stock.df, .iloc, .loc expose raw data and enable future peeking
-    _FORBIDDEN_ATTRS = {"df", "iloc", "loc", "iat", "at", "values", "index"}
 
-    for node in ast.walk(tree):
-        if isinstance(node, (ast.Global, ast.Nonlocal)):
-            raise ValueError("global/nonlocal are not allowed in strategy code")
-        if isinstance(node, ast.Attribute) and isinstance(node.attr, str):
-            if block_lookahead and node.attr in _FORBIDDEN_ATTRS:
-                raise ValueError(
-                    f"[Lookahead blocked] Access to '{node.attr}' is not allowed. "
-                    "Use stock.price(index), stock.get_candle(index), stock.sma(period), etc. "
-                    "Only use data at or before the current bar index in update()."
-                )
-            if node.attr.startswith("__") and node.attr not in _ALLOWED_DUNDER_ATTRS:
-                raise ValueError("Access to dunder attributes is not allowed")
-        if isinstance(node, ast.Name) and node.id in _FORBIDDEN_NAMES:
-            raise ValueError(f"Use of '{node.id}' is not allowed in strategy code")
-        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FORBIDDEN_NAMES:
-            raise ValueError(f"Calls to '{node.func.id}' are not allowed in strategy code")
+# Restricted builtins for strategy sandbox; no print to avoid server log leakage.
+# Built once and shared by every exec: strategy code cannot reach it (__builtins__, globals() and vars are
+# forbidden names). Kept a plain dict, not a MappingProxyType: CPython only specializes LOAD_GLOBAL for
+# dict builtins, and user update() loops look up len/range/min/... on every bar.
+_SAFE_BUILTINS = {
+    "__build_class__": __build_class__,
+    "__import__": _safe_import,
+    "Exception": Exception,
+    "ValueError": ValueError,
+    "TypeError": TypeError,
+    "range": range,
+    "len": len,
+    "min": min,
+    "max": max,
+    "sum": sum,
+    "abs": abs,
+    "round": round,
+    "int": int,
+    "float": float,
+    "str": str,
+    "bool": bool,
+    "list": list,
+    "dict": dict,
+    "set": set,
+    "tuple": tuple,
+    "enumerate": enumerate,
+    "zip": zip,
+    "next": next,
+    "any": any,
+    "all": all,
+    "sorted": sorted,
+    "super": super,
+}
 
-    _validate_strategy_imports(tree)
-    return tree
 
+# Module globals every strategy starts from; the same for all sources, so one template is copied per exec.
+_NAMESPACE_TEMPLATE = {
+    "Strategy": Strategy,
+    "__builtins__": _SAFE_BUILTINS,
+    "__name__": "__strategy__",
+}
 
-def _safe_builtins() -> dict:
-    """Restricted builtins for strategy sandbox; no print to avoid server log leakage."""
-    return {
-        "__build_class__": __build_class__,
-        "__import__": _safe_import,
-        "Exception": Exception,
-        "ValueError": ValueError,
-        "TypeError": TypeError,
-        "range": range,
-        "len": len,
-        "min": min,
-        "max": max,
-        "sum": sum,
-        "abs": abs,
-        "round": round,
-        "int": int,
-        "float": float,
-        "str": str,
-        "bool": bool,
-        "list": list,
-        "dict": dict,
-        "set": set,
-        "tuple": tuple,
-        "enumerate": enumerate,
-        "zip": zip,
-        "next": next,
-        "any": any,
-        "all": all,
-        "sorted": sorted,
-        "super": super,
-    }
+
+@lru_cache(maxsize=128)
+def _compile_strategy(code: str, block_lookahead: bool):
+    """Validate and compile once per (source, lookahead mode); re-runs of a strategy skip parse/walk/compile.
+    Invalid code raises ValueError, which lru_cache does not cache."""
+    tree = _validate_strategy_code(code, block_lookahead=block_lookahead)
+    return compile(tree, "<strategy>", "exec")
 
 
 def _exec_strategy_code(stock, portfolio, code, *, block_lookahead: bool = True):
     """Execute validated strategy code. Runs in thread with timeout."""
-    tree = _validate_strategy_code(code, block_lookahead=block_lookahead)
-    namespace = {
-        "Strategy": Strategy,
-        "__builtins__": _safe_builtins(),
-        "__name__": "__strategy__",
-    }
-    exec(compile(tree, "<strategy>", "exec"), namespace)
-    for name, obj in namespace.items():
-        if isinstance(obj, type) and issubclass(obj, Strategy) and obj is not Strategy:
-            return obj(stock, portfolio)
+    code_obj = _compile_strategy(code, bool(block_lookahead))
+    # exec per call: each run gets fresh class objects, so class-level state never leaks between runs
+    namespace = _NAMESPACE_TEMPLATE.copy()
+    with collect_subclasses() as defined:
+        exec(code_obj, namespace)
+    if defined:
+        return defined[0](stock, portfolio)
     raise ValueError("Code must define a class that inherits from Strategy")
 
 
@@ -207,12 +236,29 @@ def create_strategy_from_code(stock, portfolio, code, *, block_lookahead: bool =
         raise ValueError("Strategy code cannot be empty")
     if len(code) > STRATEGY_CODE_MAX_LEN:
         raise ValueError(f"Strategy code exceeds maximum length ({STRATEGY_CODE_MAX_LEN})")
-    with ThreadPoolExecutor(max_workers=1) as ex:
-        future = ex.submit(_exec_strategy_code, stock, portfolio, code, block_lookahead=block_lookahead)
+    # A throwaway daemon thread per call: a Python thread cannot be killed, so code that never returns
+    # keeps only its own thread (and does not block shutdown) instead of a slot in a shared pool.
+    future: Future = Future()
+
+    def run() -> None:
+        future.set_running_or_notify_cancel()
         try:
-            return future.result(timeout=STRATEGY_EXEC_TIMEOUT)
-        except FuturesTimeoutError:
-            raise ValueError(f"Strategy execution timed out after {STRATEGY_EXEC_TIMEOUT}s")
+            future.set_result(_exec_strategy_code(stock, portfolio, code, block_lookahead=block_lookahead))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="strategy", daemon=True).start()
+    try:
+        return future.result(timeout=STRATEGY_EXEC_TIMEOUT)
+    except FuturesTimeoutError:
+        raise ValueError(f"Strategy execution timed out after {STRATEGY_EXEC_TIMEOUT}s")
+
+
+def _bar_dates(index) -> list:
+    """YYYY-MM-DD per bar for equity recording (None where the label is not a date)."""
+    if isinstance(index, pd.DatetimeIndex):
+        return [d if isinstance(d, str) else None for d in index.strftime("%Y-%m-%d")]
+    return [str(d)[:10] for d in index]
 
 
 class Backtest:
@@ -226,28 +272,88 @@ class Backtest:
         end_iloc = self.strategy.stock.to_iloc(end_date)
         if start_iloc > end_iloc:
             return
-        self.strategy.start(self.strategy.stock.get_candle(start_date))
+        stock = self.strategy.stock
+        # Slice once and convert to Python floats in bulk rather than calling get_candle per bar;
+        # the first and last rows double as the start()/end() candles.
+        bars = slice(start_iloc, end_iloc + 1)
+        opens, highs, lows, closes = (a[bars].tolist() for a in stock.ohlc_arrays())
+        self.strategy.start((opens[0], highs[0], lows[0], closes[0]))
 
+        record = self.portfolio.record_equity_per_bar
+        dates = _bar_dates(stock.dates[bars]) if record else None
+        if record:
+            self.portfolio.record_equity_bar(start_iloc, float(self.portfolio.get_value(start_iloc)), dates[0])
+
+        signals = self.strategy.signals()
+        if signals is not None:
+            self._run_signals(signals, start_iloc, end_iloc, dates, on_bar)
+            self.strategy.end((opens[-1], highs[-1], lows[-1], closes[-1]))
+            return
+
+        # Bound-method locals: LOAD_FAST instead of attribute chains on every bar.
+        update = self.strategy.update
+        get_value = self.portfolio.get_value
+        record_equity_bar = self.portfolio.record_equity_bar
+        bar_iter = zip(range(start_iloc, end_iloc + 1), opens, highs, lows, closes)
+        for offset, (candle, o, h, l, c) in enumerate(bar_iter):
+            update(o, h, l, c, candle)
+            value = float(get_value(candle))
+            if record:
+                record_equity_bar(candle, value, dates[offset])
+            if on_bar is not None:
+                on_bar(candle, value)
+        self.strategy.end((opens[-1], highs[-1], lows[-1], closes[-1]))
+
+    def _segment_values(self, lo: int, hi: int) -> np.ndarray:
+        """get_value for every bar in [lo, hi) while positions and cash stay fixed, as one array pass per position."""
+        bars = np.arange(lo, hi)
+        values = np.full(hi - lo, self.portfolio.cash, dtype=np.float64)
+        for p in self.portfolio.positions():
+            close = p["stock"].ohlc_arrays()[3]
+            # Same clamping as Stock.price, and the same cash + px * qty accumulation order as get_value
+            values += close[np.minimum(bars, close.size - 1)] * float(p["quantity"])
+        return values
+
+    def _run_signals(self, signals, start_iloc: int, end_iloc: int, dates, on_bar) -> None:
+        """
+        Drive the portfolio from Strategy.signals(): orders are placed only on signal bars, and equity for
+        the bars in between is valued in bulk. Fills, checks and per-bar values match the update() loop.
+        """
         stock = self.strategy.stock
-        if self.portfolio.record_equity_per_bar:
+        n = len(stock.dates)
+        try:
+            entries, exits, sizes = signals
+            entries = np.asarray(entries, dtype=bool)
+            exits = np.asarray(exits, dtype=bool)
+            sizes = np.broadcast_to(np.asarray(sizes, dtype=np.float64), (n,))
+        except (TypeError, ValueError):
+            raise ValueError("signals() must return (entries, exits, sizes) with one value per bar")
+        if entries.shape != (n,) or exits.shape != (n,):
+            raise ValueError("signals() must return (entries, exits, sizes) with one value per bar")
+
+        port = self.portfolio
+        signal_bars = np.flatnonzero(entries[start_iloc : end_iloc + 1] | exits[start_iloc : end_iloc + 1]) + start_iloc
+        values = np.empty(end_iloc - start_iloc + 1)
+        prev = start_iloc
+        for bar in signal_bars.tolist():
+            values[prev - start_iloc : bar - start_iloc] = self._segment_values(prev, bar)
+            pos = port.get_position(stock)
             try:
-                start_dt = stock.df.index[start_iloc]
-                start_date_str = start_dt.strftime("%Y-%m-%d") if hasattr(start_dt, "strftime") else str(start_dt)[:10]
-            except Exception:
-                start_date_str = str(start_date)[:10] if start_date else None
-            self.portfolio.record_equity_bar(start_iloc, float(self.portfolio.get_value(start_iloc)), start_date_str)
-
-        for candle in range(start_iloc, end_iloc + 1):
-            open, high, low, close = stock.get_candle(candle)
-            self.strategy.update(open, high, low, close, candle)
-            value = float(self.portfolio.get_value(candle))
-            if self.portfolio.record_equity_per_bar:
-                try:
-                    bar_dt = stock.df.index[candle]
-                    date_str = bar_dt.strftime("%Y-%m-%d") if hasattr(bar_dt, "strftime") else str(bar_dt)[:10]
-                except Exception:
-                    date_str = None
-                self.portfolio.record_equity_bar(candle, value, date_str)
+                if exits[bar] and pos is not None:
+                    port.exit_position(stock, abs(float(pos["quantity"])), index=bar)
+                    pos = None
+                if entries[bar] and pos is None:
+                    port.enter_position_long(stock, float(sizes[bar]), index=bar)
+            except ValueError:
+                pass  # rejected by the portfolio (cash, limits); the signal is dropped
+            prev = bar
+        values[prev - start_iloc :] = self._segment_values(prev, end_iloc + 1)
+
+        record = port.record_equity_per_bar
+        if not record and on_bar is None:
+            return
+        for offset, (candle, value) in enumerate(zip(range(start_iloc, end_iloc + 1), values.tolist())):
+            if record:
+                port.record_equity_bar(candle, value, dates[offset])
             if on_bar is not None:
-                on_bar(candle, value)
-        self.strategy.end(stock.get_candle(end_date))
\ No newline at end of file
+                on_bar(candle, value)
\ No newline at end of file
@@ -1,19 +1,16 @@
 """App config"""
 import os
 import logging
+import re
+from pathlib import Path
 
 # Load .env from backend directory when running uvicorn
+_ENV_LINE_RE = re.compile(r"^[ \t]*([A-Za-z_][A-Za-z0-9_]*)[ \t]*=[ \t]*(.*?)[ \t\r]*$", re.MULTILINE)
 _env_dir = os.path.dirname(os.path.abspath(__file__))
 _env_file = os.path.join(_env_dir, ".env")
 if os.path.isfile(_env_file):
-    with open(_env_file) as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith("#") and "=" in line:
-                k, _, v = line.partition("=")
-                k, v = k.strip(), v.strip().strip("'\"")
-                if k and k not in os.environ:
-                    os.environ[k] = v
+    for _m in _ENV_LINE_RE.finditer(Path(_env_file).read_text()):
+        os.environ.setdefault(_m[1], _m[2].strip("'\""))
 
 # CORS: restrict to frontend origin(s). Comma-separated for multiple.
 # In production, no fallback — empty CORS_ORIGINS means no origins allowed (fail-safe).
@@ -27,7 +24,11 @@ else:
 STOCK_CACHE_MAX = 64
 STOCK_CACHE_TTL_SEC = 60 * 60
 
-# Rate limiting (in-memory per process; use Redis for multi-worker production)
+# On-disk OHLC cache (one file per symbol/date range, refreshed after each market close). Empty disables.
+OHLC_CACHE_DIR = os.environ.get("OHLC_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "acemarket")).strip()
+
+# Rate limiting: sliding window in Redis when REDIS_URL is set (shared by all workers), else in-memory per process
+REDIS_URL = os.environ.get("REDIS_URL", "").strip()
 RATE_LIMIT_STRATEGY_WINDOW_SEC = 60
 RATE_LIMIT_STRATEGY_MAX = 5
 RATE_LIMIT_GENERAL_WINDOW_SEC = 60
@@ -71,6 +72,10 @@ if not DATABASE_URL:
         "Set it in .env (dev) or environment variables (production)."
     )
 
+# Connection pool bounds per API process. Size the max to the request threadpool plus background jobs.
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", "10"))
+
 # P0: Refuse to run in production with DISABLE_AUTH explicitly set
 if IS_PRODUCTION and _explicit_disable:
     import sys
@@ -87,7 +92,7 @@ MARGIN_TOLERANCE = 1e-6
 
 # Symbol validation (e.g. BRK.B, BHF-A)
 SYMBOL_MAX_LEN = 12
-SYMBOL_ALLOWED_CHARS = set("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.-")
+SYMBOL_ALLOWED_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.-")
 
 # Run history limit
 MAX_RUNS_PER_USER = 25
@@ -102,6 +107,11 @@ MAX_WATCHLIST_QUOTES_SYMBOLS = 50
 MAX_BACKTEST_SYMBOLS = 30
 DATE_STR_MAX_LEN = 16  # YYYY-MM-DD or similar
 
+# Backtests and Monte Carlo: N > 0 sends per-symbol runs / path batches to a pool of N spawned processes
+# (GIL-free across symbols). Off by default: each worker re-imports pandas/numba (~150 MB), and
+# os.cpu_count() reports the host's cores rather than a container's limit. 0 = threads in-process.
+STRATEGY_PROCESS_WORKERS = int(os.environ.get("STRATEGY_PROCESS_WORKERS", "0"))
+
 # Logging
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
 logging.basicConfig(
@@ -2,25 +2,204 @@
 from __future__ import annotations
 
 import logging
-from datetime import datetime, timedelta
+import os
+import re
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
 from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
+import numpy as np
 import pandas as pd
 import yfinance as yf
 
+from config import OHLC_CACHE_DIR
+
 logger = logging.getLogger(__name__)
 
+_OHLC_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+_CACHE_KEY_RE = re.compile(r"[A-Z0-9.\-^=]+_\d{4}-\d{2}-\d{2}_\d{4}-\d{2}-\d{2}")
+# US equities settle after 16:00 ET; give Yahoo a little time to finalize the bar.
+_MARKET_CLOSE_ET = (16, 30)
+
+try:
+    _ET = ZoneInfo("America/New_York")
+except ZoneInfoNotFoundError:  # slim images without tzdata
+    _ET = timezone(timedelta(hours=-5))
+
+
+def _last_market_close(now: Optional[datetime] = None) -> datetime:
+    """Most recent weekday 16:30 ET at or before now (holidays are treated as trading days)."""
+    now = (now or datetime.now(timezone.utc)).astimezone(_ET)
+    close = now.replace(hour=_MARKET_CLOSE_ET[0], minute=_MARKET_CLOSE_ET[1], second=0, microsecond=0)
+    if close > now:
+        close -= timedelta(days=1)
+    while close.weekday() >= 5:
+        close -= timedelta(days=1)
+    return close
+
+
+def _cache_path(symbol: str, from_date: str, to_date: str) -> Optional[Path]:
+    if not OHLC_CACHE_DIR:
+        return None
+    key = f"{symbol}_{from_date}_{to_date}"
+    if not _CACHE_KEY_RE.fullmatch(key):
+        return None
+    return Path(OHLC_CACHE_DIR) / f"{key}.npz"
+
+
+def _read_cache(path: Path) -> Optional[pd.DataFrame]:
+    """Cached frame if the file was written after the last market close, else None."""
+    try:
+        if path.stat().st_mtime < _last_market_close().timestamp():
+            return None
+        with np.load(path, allow_pickle=False) as z:
+            index = pd.DatetimeIndex(z["index"].view("datetime64[ns]"), name="Date")
+            return pd.DataFrame({c: z[c] for c in _OHLC_COLUMNS}, index=index)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.debug("Ignoring unreadable OHLC cache %s: %s", path, e)
+        return None
+
+
+def _read_cached_range(symbol: str, from_date: str, to_date: str) -> Optional[pd.DataFrame]:
+    """
+    Fresh cached frame for [from_date, to_date): the exact entry if present, otherwise a
+    slice of the narrowest cached fetch for symbol that covers the whole window.
+    """
+    path = _cache_path(symbol, from_date, to_date)
+    if path is None:
+        return None
+    cached = _read_cache(path)
+    if cached is not None:
+        return cached
+    covering = []
+    fresh_after = _last_market_close().timestamp()
+    for candidate in path.parent.glob(f"{symbol}_*.npz"):
+        if not _CACHE_KEY_RE.fullmatch(candidate.stem):
+            continue
+        _, cached_from, cached_to = candidate.stem.rsplit("_", 2)
+        # ISO dates compare correctly as strings
+        if cached_from <= from_date and cached_to >= to_date:
+            try:
+                if candidate.stat().st_mtime < fresh_after:
+                    continue  # stale: never loaded, and evicted by the next write for symbol
+            except OSError:
+                continue
+            span = date.fromisoformat(cached_to) - date.fromisoformat(cached_from)
+            covering.append((span, candidate))
+    for _, candidate in sorted(covering):  # narrowest fetch first: least to load and slice
+        wider = _read_cache(candidate)
+        if wider is None:
+            continue
+        lo, hi = wider.index.searchsorted([pd.Timestamp(from_date), pd.Timestamp(to_date)])
+        return wider.iloc[lo:hi]  # yfinance end is exclusive
+    return None
+
+
+def _write_cache(path: Path, df: pd.DataFrame) -> None:
+    """Write via temp file + rename so concurrent readers never see a partial file."""
+    tmp = None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f,
+                index=df.index.as_unit("ns").asi8,
+                **{c: df[c].to_numpy(dtype=np.float64) for c in _OHLC_COLUMNS},
+            )
+        os.replace(tmp, path)
+        _evict_superseded(path)
+    except Exception as e:
+        logger.debug("Could not write OHLC cache %s: %s", path, e)
+        if tmp is not None and os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def _evict_superseded(path: Path) -> None:
+    """
+    Delete the symbol's other entries that can never be served again: stale ones (written before the
+    last market close) and windows the fresh entry at path covers. Default fetches end today, so
+    without this every symbol would leave one file behind per day.
+    """
+    symbol, new_from, new_to = path.stem.rsplit("_", 2)
+    fresh_after = _last_market_close().timestamp()
+    for candidate in path.parent.glob(f"{symbol}_*.npz"):
+        if candidate == path or not _CACHE_KEY_RE.fullmatch(candidate.stem):
+            continue
+        _, cached_from, cached_to = candidate.stem.rsplit("_", 2)
+        try:
+            if (new_from <= cached_from and cached_to <= new_to) or candidate.stat().st_mtime < fresh_after:
+                candidate.unlink()
+        except OSError:  # already gone (concurrent eviction) or not ours to delete
+            continue
+
 
 def get_ohlc(
     symbol: str,
     from_date: Optional[str] = None,
     to_date: Optional[str] = None,
 ) -> pd.DataFrame:
-    """Fetch daily OHLC from Yahoo Finance."""
+    """Fetch daily OHLC from Yahoo Finance, served from the on-disk cache when it is fresh."""
     symbol = symbol.upper().strip()
     to_date = to_date or datetime.now().strftime("%Y-%m-%d")
     from_date = from_date or (datetime.now() - timedelta(days=365 * 2)).strftime("%Y-%m-%d")
 
+    cached = _read_cached_range(symbol, from_date, to_date)
+    if cached is not None:
+        return cached
+    out = _download_ohlc(symbol, from_date, to_date)
+    path = _cache_path(symbol, from_date, to_date)
+    if path is not None and not out.empty:
+        _write_cache(path, out)
+    return out
+
+
+def get_ohlc_many(
+    symbols: list[str],
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+) -> dict[str, pd.DataFrame]:
+    """Daily OHLC for several symbols; cache misses are fetched in one threaded yf.download call."""
+    symbols = list(dict.fromkeys(s.upper().strip() for s in symbols if s and s.strip()))
+    to_date = to_date or datetime.now().strftime("%Y-%m-%d")
+    from_date = from_date or (datetime.now() - timedelta(days=365 * 2)).strftime("%Y-%m-%d")
+
+    out: dict[str, pd.DataFrame] = {}
+    missing: list[str] = []
+    for symbol in symbols:
+        cached = _read_cached_range(symbol, from_date, to_date)
+        if cached is not None:
+            out[symbol] = cached
+        else:
+            missing.append(symbol)
+    if not missing:
+        return out
+
+    big = yf.download(
+        missing,
+        start=from_date,
+        end=to_date,
+        auto_adjust=True,
+        progress=False,
+        threads=True,
+        group_by="ticker",
+    )
+    tickers = set(big.columns.get_level_values(0)) if isinstance(big.columns, pd.MultiIndex) else set()
+    for symbol in missing:
+        df = _clean_ohlc(big[symbol], symbol) if symbol in tickers else pd.DataFrame()
+        path = _cache_path(symbol, from_date, to_date)
+        if path is not None and not df.empty:
+            _write_cache(path, df)
+        out[symbol] = df
+    return out
+
+
+def _download_ohlc(symbol: str, from_date: str, to_date: str) -> pd.DataFrame:
+    """Download daily OHLC for one symbol from Yahoo Finance."""
     df = yf.download(
         symbol,
         start=from_date,
@@ -29,33 +208,39 @@ def get_ohlc(
         progress=False,
         threads=False,
     )
+    return _clean_ohlc(df, symbol)
+
+
+def _clean_ohlc(df: pd.DataFrame, symbol: str) -> pd.DataFrame:
+    """Flatten Yahoo columns to OHLCV, strip tz, and drop missing or invalid rows."""
     if df.empty:
         return pd.DataFrame()
     if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
+        df.columns = df.columns.droplevel(1)  # (Price, Ticker) -> Price
     required = ["Open", "High", "Low", "Close"]
     if not all(c in df.columns for c in required):
         return pd.DataFrame()
-    out = df[required].copy()
-    out["Volume"] = df["Volume"] if "Volume" in df.columns else 0
-    out.index = pd.to_datetime(out.index)
-    if out.index.tz is not None:
-        out.index = out.index.tz_localize(None)
+    # Column selection already copies; drop-missing and sanity checks share one mask and one final filter.
+    if "Volume" in df.columns:
+        out = df[[*required, "Volume"]]
+    else:
+        out = df[required].assign(Volume=0)
+    index = pd.to_datetime(out.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    out.index = index
     out.index.name = "Date"
-    out = out.dropna(subset=required)
-
-    # OHLC sanity validation: High >= Low, Open/Close within [Low, High], positive values
-    mask = (
-        (out["High"] >= out["Low"])
-        & (out["Open"] >= out["Low"])
-        & (out["Open"] <= out["High"])
-        & (out["Close"] >= out["Low"])
-        & (out["Close"] <= out["High"])
-        & (out[required].gt(0).all(axis=1))
-    )
-    invalid_count = (~mask).sum()
-    if invalid_count > 0:
-        logger.warning("Dropped %d invalid OHLC rows for %s (High<Low or O/C outside range or non-positive)", invalid_count, symbol)
+
+    # OHLC sanity validation: High >= Low, Open/Close within [Low, High], positive values.
+    # Comparisons with NaN are False, so rows with missing prices fail the mask too.
+    arr = out[required].to_numpy(dtype=np.float64)
+    o, h, l, c = arr.T
+    mask = (h >= l) & (o >= l) & (o <= h) & (c >= l) & (c <= h) & (arr > 0).all(axis=1)
+    kept = int(np.count_nonzero(mask))
+    if kept < mask.size:
+        invalid_count = int(np.count_nonzero(~mask & ~np.isnan(arr).any(axis=1)))
+        if invalid_count:
+            logger.warning("Dropped %d invalid OHLC rows for %s (High<Low or O/C outside range or non-positive)", invalid_count, symbol)
         out = out[mask]
     return out
 
@@ -4,13 +4,14 @@ import logging
 import uuid
 from datetime import datetime, timezone
 from threading import Lock
-from typing import Optional
+from typing import Callable, Optional
 
+import orjson
 import psycopg2
 import psycopg2.extras
 from psycopg2.pool import ThreadedConnectionPool
 
-from config import DATABASE_URL
+from config import DATABASE_URL, DB_POOL_MAX, DB_POOL_MIN
 
 logger = logging.getLogger(__name__)
 
@@ -23,29 +24,48 @@ def _get_pool() -> ThreadedConnectionPool:
     if _pool is None:
         with _pool_lock:
             if _pool is None:
-                _pool = ThreadedConnectionPool(1, 10, DATABASE_URL)
+                _pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, DATABASE_URL)
     return _pool
 
 
 def _conn():
-    return _get_pool().getconn()
+    # Autocommit: every call here is a single statement, so skip the implicit BEGIN and the
+    # COMMIT (or the pool's ROLLBACK on put for reads) — one round-trip per query instead of three.
+    conn = _get_pool().getconn()
+    if not conn.autocommit:
+        conn.autocommit = True
+    return conn
 
 
 def _put(conn):
     _get_pool().putconn(conn)
 
 
+# JSON columns: orjson with the same options as the API responses (NaN/inf are written as null).
+_ORJSON_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _dumps(obj) -> str:
+    return orjson.dumps(obj, option=_ORJSON_OPTS).decode()
+
+
+def _loads(text: str):
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return json.loads(text)  # rows written by the stdlib encoder may contain NaN/Infinity
+
+
 def init_db():
     conn = _conn()
     try:
         with conn.cursor() as cur:
+            # One multi-statement query: a single round-trip (and implicit transaction) for the whole schema
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS settings (
                     user_id TEXT PRIMARY KEY,
                     settings_json TEXT NOT NULL DEFAULT '{}'
-                )
-            """)
-            cur.execute("""
+                );
                 CREATE TABLE IF NOT EXISTS portfolios (
                     user_id TEXT PRIMARY KEY,
                     cash DOUBLE PRECISION NOT NULL DEFAULT 0,
@@ -53,21 +73,18 @@ def init_db():
                     trade_log_json TEXT NOT NULL DEFAULT '[]',
                     equity_curve_json TEXT NOT NULL DEFAULT '[]',
                     realized_json TEXT NOT NULL DEFAULT '{}'
-                )
-            """)
-            cur.execute("""
+                );
                 CREATE TABLE IF NOT EXISTS strategies (
                     id TEXT PRIMARY KEY,
                     user_id TEXT NOT NULL,
                     name TEXT NOT NULL,
                     code TEXT NOT NULL,
                     created_at TEXT NOT NULL
-                )
-            """)
-            cur.execute("""
-                CREATE INDEX IF NOT EXISTS strategies_user_id_idx ON strategies (user_id)
-            """)
-            cur.execute("""
+                );
+                -- (user_id, created_at DESC) serves both the user_id filter and the newest-first listing,
+                -- so LIMIT stops after the first index entries instead of sorting every row the user has
+                CREATE INDEX IF NOT EXISTS strategies_user_created_idx ON strategies (user_id, created_at DESC);
+                DROP INDEX IF EXISTS strategies_user_id_idx;
                 CREATE TABLE IF NOT EXISTS runs (
                     id TEXT PRIMARY KEY,
                     user_id TEXT NOT NULL,
@@ -80,10 +97,32 @@ def init_db():
                     portfolio_json TEXT NOT NULL DEFAULT '{}',
                     metrics_json TEXT NOT NULL DEFAULT '{}',
                     created_at TEXT NOT NULL
-                )
-            """)
-            cur.execute("""
-                CREATE INDEX IF NOT EXISTS runs_user_id_idx ON runs (user_id)
+                );
+                CREATE INDEX IF NOT EXISTS runs_user_created_idx ON runs (user_id, created_at DESC);
+                DROP INDEX IF EXISTS runs_user_id_idx;
+                -- NULL instead of an error for text Postgres cannot parse as JSON, so one malformed
+                -- row cannot fail a whole query that extracts fields from stored blobs. Created once:
+                -- CREATE OR REPLACE on every boot races between workers ("tuple concurrently updated")
+                -- and needs DDL rights each time.
+                DO $do$
+                BEGIN
+                    IF NOT EXISTS (
+                        SELECT 1 FROM pg_proc
+                        WHERE proname = 'try_json' AND pronamespace = current_schema()::regnamespace
+                    ) THEN
+                        CREATE FUNCTION try_json(t TEXT) RETURNS JSON AS $fn$
+                        BEGIN
+                            RETURN t::json;
+                        EXCEPTION WHEN others THEN
+                            RETURN NULL;
+                        END;
+                        $fn$ LANGUAGE plpgsql IMMUTABLE;
+                    END IF;
+                EXCEPTION WHEN duplicate_function OR unique_violation THEN
+                    NULL;  -- another worker created it between the check and the CREATE (unique_violation
+                           -- is what a concurrent insert into pg_proc raises)
+                END
+                $do$;
             """)
         conn.commit()
         logger.info("Database tables ready")
@@ -125,37 +164,65 @@ DEFAULT_SETTINGS = {
 # Settings
 # ---------------------------------------------------------------------------
 
+def _with_defaults(stored: dict) -> dict:
+    data = {**DEFAULT_SETTINGS, **stored}
+    if "watchlist" not in data or not isinstance(data.get("watchlist"), list):
+        data["watchlist"] = DEFAULT_WATCHLIST.copy()
+    return data
+
+
 def get_settings(user_id: str) -> dict:
     conn = _conn()
     try:
         with conn.cursor() as cur:
             cur.execute("SELECT settings_json FROM settings WHERE user_id = %s", (user_id,))
             row = cur.fetchone()
-        if row:
-            stored = json.loads(row[0])
-            data = {**DEFAULT_SETTINGS, **stored}
-            if "watchlist" not in data or not isinstance(data.get("watchlist"), list):
-                data["watchlist"] = DEFAULT_WATCHLIST.copy()
-            return data
-        out = DEFAULT_SETTINGS.copy()
-        out["watchlist"] = DEFAULT_WATCHLIST.copy()
-        return out
+        return _with_defaults(_loads(row[0]) if row else {})
     finally:
         _put(conn)
 
 
-def save_settings(user_id: str, settings: dict):
-    merged = {**DEFAULT_SETTINGS, **settings}
-    if "watchlist" not in merged or not isinstance(merged.get("watchlist"), list):
-        merged["watchlist"] = DEFAULT_WATCHLIST.copy()
+def merge_settings(user_id: str, patch: dict, validate: Optional[Callable[[dict], None]] = None) -> dict:
+    """Merge patch into the stored settings in one UPSERT and return the result (with defaults).
+    validate(settings) runs before commit; if it raises, the merge is rolled back."""
     conn = _conn()
+    conn.autocommit = validate is None
     try:
         with conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO settings (user_id, settings_json)
                 VALUES (%s, %s)
-                ON CONFLICT (user_id) DO UPDATE SET settings_json = EXCLUDED.settings_json
-            """, (user_id, json.dumps(merged)))
+                ON CONFLICT (user_id) DO UPDATE
+                    SET settings_json = (settings.settings_json::jsonb || %s::jsonb)::text
+                RETURNING settings_json
+            """, (user_id, _dumps(_with_defaults(patch)), _dumps(patch)))
+            merged = _with_defaults(_loads(cur.fetchone()[0]))
+        if validate is not None:
+            try:
+                validate(merged)
+            except Exception:
+                conn.rollback()
+                raise
+        conn.commit()
+        return merged
+    finally:
+        _put(conn)
+
+
+def _upsert_settings(cur, user_id: str, settings: dict):
+    merged = _with_defaults(settings)
+    cur.execute("""
+        INSERT INTO settings (user_id, settings_json)
+        VALUES (%s, %s)
+        ON CONFLICT (user_id) DO UPDATE SET settings_json = EXCLUDED.settings_json
+    """, (user_id, _dumps(merged)))
+
+
+def save_settings(user_id: str, settings: dict):
+    conn = _conn()
+    try:
+        with conn.cursor() as cur:
+            _upsert_settings(cur, user_id, settings)
         conn.commit()
     finally:
         _put(conn)
@@ -179,15 +246,35 @@ def get_portfolio_state(user_id: str) -> Optional[dict]:
             return None
         return {
             "cash": float(row[0]),
-            "positions": json.loads(row[1] or "[]"),
-            "trade_log": json.loads(row[2] or "[]"),
-            "equity_curve": json.loads(row[3] or "[]"),
-            "realized": json.loads(row[4] or "{}"),
+            "positions": _loads(row[1] or "[]"),
+            "trade_log": _loads(row[2] or "[]"),
+            "equity_curve": _loads(row[3] or "[]"),
+            "realized": _loads(row[4] or "{}"),
         }
     finally:
         _put(conn)
 
 
+def _position_row(p) -> Optional[dict]:
+    """Persisted form of one open position, or None for malformed or flat entries."""
+    if not isinstance(p, dict):
+        return None
+    get = p.get
+    stock = get("stock")
+    symbol = getattr(stock, "symbol", None) if stock else get("symbol")
+    if not symbol:
+        return None
+    qty = float(get("quantity", 0))
+    if qty == 0:
+        return None
+    return {
+        "symbol": str(symbol).upper(),
+        "quantity": qty,
+        "avg_price": float(get("avg_price", 0)),
+        "realized_pnl": float(get("realized_pnl", 0)),
+    }
+
+
 def save_portfolio_state(
     user_id: str,
     cash: float,
@@ -195,28 +282,15 @@ def save_portfolio_state(
     trade_log: list,
     equity_curve: list,
     realized: dict,
+    settings: Optional[dict] = None,
 ):
-    positions_data = []
-    for p in positions or []:
-        if not isinstance(p, dict):
-            continue
-        stock = p.get("stock")
-        symbol = getattr(stock, "symbol", None) if stock else p.get("symbol")
-        if not symbol:
-            continue
-        symbol = str(symbol).upper()
-        qty = float(p.get("quantity", 0))
-        if qty == 0:
-            continue
-        positions_data.append({
-            "symbol": symbol,
-            "quantity": qty,
-            "avg_price": float(p.get("avg_price", 0)),
-            "realized_pnl": float(p.get("realized_pnl", 0)),
-        })
+    """Upsert the portfolio row (whole lists as JSON, one statement). With settings, the settings row is
+    written in the same transaction, so a settings change and its portfolio adjustment land together."""
+    positions_data = [row for row in map(_position_row, positions or ()) if row is not None]
 
     realized_serializable = {k: float(v) for k, v in (realized or {}).items()}
     conn = _conn()
+    conn.autocommit = settings is None  # portfolio + settings rows must commit together
     try:
         with conn.cursor() as cur:
             cur.execute("""
@@ -231,11 +305,13 @@ def save_portfolio_state(
             """, (
                 user_id,
                 float(cash),
-                json.dumps(positions_data),
-                json.dumps(trade_log or []),
-                json.dumps(equity_curve or []),
-                json.dumps(realized_serializable),
+                _dumps(positions_data),
+                _dumps(trade_log or []),
+                _dumps(equity_curve or []),
+                _dumps(realized_serializable),
             ))
+            if settings is not None:
+                _upsert_settings(cur, user_id, settings)
         conn.commit()
     finally:
         _put(conn)
@@ -295,26 +371,15 @@ def update_strategy(user_id: str, strategy_id: str, name: Optional[str], code: O
     conn = _conn()
     try:
         with conn.cursor() as cur:
-            if name is not None and code is not None:
-                cur.execute(
-                    "UPDATE strategies SET name = %s, code = %s WHERE id = %s AND user_id = %s RETURNING id, name, code",
-                    (name, code, strategy_id, user_id)
-                )
-            elif name is not None:
-                cur.execute(
-                    "UPDATE strategies SET name = %s WHERE id = %s AND user_id = %s RETURNING id, name, code",
-                    (name, strategy_id, user_id)
-                )
-            elif code is not None:
-                cur.execute(
-                    "UPDATE strategies SET code = %s WHERE id = %s AND user_id = %s RETURNING id, name, code",
-                    (code, strategy_id, user_id)
-                )
-            else:
-                cur.execute(
-                    "SELECT id, name, code FROM strategies WHERE id = %s AND user_id = %s",
-                    (strategy_id, user_id)
-                )
+            # NULL keeps the stored value, so every partial update is one statement
+            cur.execute(
+                """
+                UPDATE strategies SET name = COALESCE(%s, name), code = COALESCE(%s, code)
+                WHERE id = %s AND user_id = %s
+                RETURNING id, name, code
+                """,
+                (name, code, strategy_id, user_id)
+            )
             row = cur.fetchone()
         conn.commit()
         if not row:
@@ -358,12 +423,12 @@ def save_run(user_id: str, run_data: dict) -> str:
                 user_id,
                 str(run_data["strategy_id"]),
                 run_data["strategy"],
-                json.dumps(run_data.get("symbols", [])),
+                _dumps(run_data.get("symbols", [])),
                 run_data["start_date"],
                 run_data["end_date"],
-                json.dumps(run_data.get("results", [])),
-                json.dumps(run_data.get("portfolio", {})),
-                json.dumps(run_data.get("metrics", {})),
+                _dumps(run_data.get("results", [])),
+                _dumps(run_data.get("portfolio", {})),
+                _dumps(run_data.get("metrics", {})),
                 created_at,
             ))
         conn.commit()
@@ -376,10 +441,18 @@ def get_runs(user_id: str, limit: int = 25) -> list[dict]:
     conn = _conn()
     try:
         with conn.cursor() as cur:
+            # The list only needs two scalars from portfolio_json (which carries whole trade logs and
+            # equity curves), so Postgres extracts them instead of shipping the blob to be decoded here.
+            # Rows Postgres cannot parse (bare NaN/Infinity from the stdlib encoder, or anything malformed)
+            # come back whole in legacy_portfolio and are decoded in Python as before, one row at a time.
             cur.execute("""
                 SELECT id, created_at, strategy_id, strategy_name, symbols_json,
-                    start_date, end_date, metrics_json, portfolio_json
-                FROM runs WHERE user_id = %s
+                    start_date, end_date, metrics_json,
+                    CASE WHEN p IS NULL THEN portfolio_json END AS legacy_portfolio,
+                    p ->> 'run_type',
+                    p ->> 'prob_profit_pct'
+                FROM runs CROSS JOIN LATERAL (SELECT try_json(portfolio_json) AS p) AS parsed
+                WHERE user_id = %s
                 ORDER BY created_at DESC LIMIT %s
             """, (user_id, limit))
             rows = cur.fetchall()
@@ -387,24 +460,28 @@ def get_runs(user_id: str, limit: int = 25) -> list[dict]:
         _put(conn)
 
     out = []
-    for r in rows:
+    for (rid, created_at, strategy_id, strategy_name, symbols_json, start_date, end_date,
+         metrics_json, legacy_portfolio, run_type, prob_profit) in rows:
         try:
-            metrics = json.loads(r[7] or "{}")
-            portfolio = json.loads(r[8] or "{}")
-        except (json.JSONDecodeError, TypeError):
+            metrics = _loads(metrics_json or "{}")
+            if legacy_portfolio is not None:
+                portfolio = _loads(legacy_portfolio or "{}")
+            else:
+                prob_profit = float(prob_profit) if prob_profit is not None else None
+                portfolio = {"run_type": run_type or "backtest", "prob_profit_pct": prob_profit}
+        except (json.JSONDecodeError, TypeError, ValueError):
             metrics, portfolio = {}, {}
         equity = metrics.get("equity", {})
         trades = metrics.get("trades", {})
-        run_type = portfolio.get("run_type", "backtest")
         out.append({
-            "id": r[0],
-            "created_at": r[1],
-            "strategy": r[3],
-            "strategy_id": r[2],
-            "symbols": json.loads(r[4] or "[]"),
-            "start_date": r[5],
-            "end_date": r[6],
-            "run_type": run_type,
+            "id": rid,
+            "created_at": created_at,
+            "strategy": strategy_name,
+            "strategy_id": strategy_id,
+            "symbols": _loads(symbols_json or "[]"),
+            "start_date": start_date,
+            "end_date": end_date,
+            "run_type": portfolio.get("run_type", "backtest"),
             "start_value": equity.get("start_value"),
             "end_value": equity.get("end_value"),
             "pnl": equity.get("pnl"),
@@ -440,12 +517,12 @@ def get_run(user_id: str, run_id: str) -> Optional[dict]:
         "ended_at": row[1],
         "strategy_id": row[2],
         "strategy": row[3],
-        "symbols": json.loads(row[4] or "[]"),
+        "symbols": _loads(row[4] or "[]"),
         "start_date": row[5],
         "end_date": row[6],
-        "results": json.loads(row[7] or "[]"),
-        "portfolio": json.loads(row[8] or "{}"),
-        "metrics": json.loads(row[9] or "{}"),
+        "results": _loads(row[7] or "[]"),
+        "portfolio": _loads(row[8] or "{}"),
+        "metrics": _loads(row[9] or "{}"),
     }
 
 
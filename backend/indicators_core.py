@@ -0,0 +1,84 @@
+"""Numba kernels shared by the Stock indicators. Inputs are contiguous float64 arrays."""
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True, fastmath=True)
+def ewm_adjust_false(x: np.ndarray, alpha: float) -> np.ndarray:
+    """Recursive EWMA (pandas ewm(adjust=False)): avg = alpha * x + (1 - alpha) * prev."""
+    out = np.empty_like(x)
+    if x.shape[0] == 0:
+        return out
+    avg = x[0]
+    out[0] = avg
+    for i in range(1, x.shape[0]):
+        avg = alpha * x[i] + (1.0 - alpha) * avg
+        out[i] = avg
+    return out
+
+
+@njit(cache=True)
+def adx_kernel(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int):
+    """
+    Single pass over OHLC computing (tr, plus_dm, minus_dm, atr, pdi, mdi, dx, adx).
+    ATR and the DM sums use Wilder smoothing seeded at index period; ADX is seeded
+    with mean(dx[period:2*period]) at index 2*period-1. Warmup entries are NaN
+    (tr/dm/pdi/mdi are 0 there instead).
+    """
+    n = high.shape[0]
+    tr = np.zeros(n)
+    plus_dm = np.zeros(n)
+    minus_dm = np.zeros(n)
+    atr = np.full(n, np.nan)
+    pdi = np.zeros(n)
+    mdi = np.zeros(n)
+    dx = np.full(n, np.nan)
+    adx = np.full(n, np.nan)
+    if n == 0:
+        return tr, plus_dm, minus_dm, atr, pdi, mdi, dx, adx
+    tr[0] = high[0] - low[0]
+    a = 0.0
+    sp = 0.0
+    sm = 0.0
+    dx_avg = 0.0
+    for i in range(1, n):
+        hl = high[i] - low[i]
+        hc = abs(high[i] - close[i - 1])
+        lc = abs(low[i] - close[i - 1])
+        tr[i] = max(hl, max(hc, lc))
+        up = high[i] - high[i - 1]
+        down = low[i - 1] - low[i]
+        if up > down and up > 0:
+            plus_dm[i] = up
+        if down > up and down > 0:
+            minus_dm[i] = down
+        if period < 1:
+            continue
+        if i < period:
+            a += tr[i]
+            sp += plus_dm[i]
+            sm += minus_dm[i]
+            continue
+        if i == period:
+            a = (a + tr[i]) / period
+            sp = (sp + plus_dm[i]) / period
+            sm = (sm + minus_dm[i]) / period
+        else:
+            a += (tr[i] - a) / period
+            sp += (plus_dm[i] - sp) / period
+            sm += (minus_dm[i] - sm) / period
+        atr[i] = a
+        if a > 0:
+            pdi[i] = 100.0 * sp / a
+            mdi[i] = 100.0 * sm / a
+        di_sum = pdi[i] + mdi[i]
+        dx[i] = 100.0 * abs(pdi[i] - mdi[i]) / di_sum if di_sum > 0 else 0.0
+        if i < 2 * period - 1:
+            dx_avg += dx[i]
+        elif i == 2 * period - 1:
+            dx_avg = (dx_avg + dx[i]) / period
+            adx[i] = dx_avg
+        else:
+            dx_avg += (dx[i] - dx_avg) / period
+            adx[i] = dx_avg
+    return tr, plus_dm, minus_dm, atr, pdi, mdi, dx, adx
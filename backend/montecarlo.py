@@ -2,10 +2,11 @@
 from __future__ import annotations
 
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
 from datetime import datetime
 import numpy as np
 import pandas as pd
+from numba import njit
 
 from backtest import Backtest, create_strategy_from_code
 from portfolio import Portfolio
@@ -21,32 +22,12 @@ def _extract_returns(stock: Stock) -> np.ndarray:
     return returns.values.astype(float)
 
 
-def _build_synthetic_ohlc(
-    start_price: float,
-    returns: np.ndarray,
-    horizon: int,
-    seed: int | None = None,
-) -> pd.DataFrame:
-    """Build synthetic OHLC path by sampling returns with replacement."""
-    rng = np.random.default_rng(seed)
-    n = len(returns)
-    if n == 0:
-        raise ValueError("No historical returns to sample from")
-
-    sampled = rng.choice(returns, size=horizon, replace=True)
-    dates = pd.date_range(
-        start=datetime.now().strftime("%Y-%m-%d"),
-        periods=horizon,
-        freq="B",
-    )
-
-    opens = []
-    highs = []
-    lows = []
-    closes = []
+@njit(cache=True)
+def _fill_ohlc(start_price, sampled, opens, highs, lows, closes):
+    """Compound sampled returns bar by bar into preallocated OHLC arrays (each bar opens at the prior close)."""
     prev_close = start_price
-
-    for r in sampled:
+    for i in range(sampled.shape[0]):
+        r = sampled[i]
         open_p = prev_close
         close_p = open_p * (1.0 + r)
         # Simple range: sample from historical volatility if available
@@ -59,27 +40,32 @@ def _build_synthetic_ohlc(
             high_p = close_p
         if close_p < low_p:
             low_p = close_p
-
-        opens.append(open_p)
-        highs.append(high_p)
-        lows.append(low_p)
-        closes.append(close_p)
+        opens[i] = open_p
+        highs[i] = high_p
+        lows[i] = low_p
+        closes[i] = close_p
         prev_close = close_p
 
-    df = pd.DataFrame(
-        {"Open": opens, "High": highs, "Low": lows, "Close": closes},
-        index=dates,
-    )
-    df.index.name = "Date"
-    return df
+
+def _synthetic_dates(horizon: int) -> pd.DatetimeIndex:
+    """Business days starting today, shared by every simulated path."""
+    return pd.date_range(start=datetime.now().strftime("%Y-%m-%d"), periods=horizon, freq="B", name="Date")
+
+
+def _synthetic_ohlc_arrays(start_price: float, sampled: np.ndarray) -> tuple[np.ndarray, ...]:
+    """(open, high, low, close) arrays compounded from pre-sampled returns (one bar per return)."""
+    sampled = np.ascontiguousarray(sampled, dtype=np.float64)
+    opens, highs, lows, closes = (np.empty(len(sampled)) for _ in range(4))
+    _fill_ohlc(float(start_price), sampled, opens, highs, lows, closes)
+    return opens, highs, lows, closes
 
 
 def _run_single_path(args: tuple) -> tuple[float | None, list[float] | None]:
     """Run one Monte Carlo path in parallel."""
-    (seed, start_price, returns, horizon, symbol, strategy_code, settings, block_lookahead) = args
+    (sampled, start_price, dates, symbol, strategy_code, settings, block_lookahead) = args
     try:
-        df = _build_synthetic_ohlc(start_price, returns, horizon, seed=seed)
-        synthetic_stock = Stock(symbol=symbol, df=df)
+        # Arrays straight into the Stock: the backtest loop never needs a per-path DataFrame
+        synthetic_stock = Stock.from_arrays(symbol, dates, *_synthetic_ohlc_arrays(start_price, sampled))
         port = Portfolio()
         cash = float(settings.get("initial_cash", 100000))
         port.add_cash(cash)
@@ -109,14 +95,22 @@ def _run_single_path(args: tuple) -> tuple[float | None, list[float] | None]:
         def on_bar(idx: int, val: float):
             curve.append(val)
 
-        first_date = df.index[0].strftime("%Y-%m-%d")
-        last_date = df.index[-1].strftime("%Y-%m-%d")
-        bt.run(first_date, last_date, on_bar=on_bar)
+        bt.run(0, len(dates) - 1, on_bar=on_bar)
         return (float(port.get_value()), curve if curve else None)
     except Exception:
         return (None, None)
 
 
+_PATHS_PER_TASK = 8
+_FAN_QUANTILES = (5, 25, 50, 75, 95)
+_FAN_KEYS = ("p5", "p25", "p50", "p75", "p95")
+
+
+def _run_paths(args_chunk: list[tuple]) -> list[tuple[float | None, list[float] | None]]:
+    """Run a batch of paths in one task, so a process pool pays one round-trip per batch instead of per path."""
+    return [_run_single_path(a) for a in args_chunk]
+
+
 def run_montecarlo(
     stock: Stock,
     strategy_code: str,
@@ -124,10 +118,13 @@ def run_montecarlo(
     n_sims: int = 100,
     horizon: int = 252,
     block_lookahead: bool = True,
+    executor: Executor | None = None,
 ) -> dict:
     """
     Run Monte Carlo simulation: bootstrap sample from stock's historical returns,
     build synthetic price paths, run strategy on each, return distribution of outcomes.
+    Paths are independent; pass a ProcessPoolExecutor as executor to spread them across cores
+    (default: a private thread pool).
     """
     returns = _extract_returns(stock)
     if len(returns) < 10:
@@ -141,65 +138,61 @@ def run_montecarlo(
     equity_by_day: list[list[float]] = []
     errors = 0
 
-    returns_arr = np.asarray(returns, dtype=float)
+    # One generator and one bulk draw for every path (fixed seed: same inputs give the same distribution)
+    rng = np.random.default_rng(0)
+    all_samples = rng.choice(np.asarray(returns, dtype=float), size=(n_sims, horizon), replace=True)
+    # One business-day calendar for the whole run: paths index bars by its first horizon days and the
+    # fan chart prepends today as day 0 (curves never exceed horizon bars, so horizon + 1 covers it).
+    calendar = _synthetic_dates(horizon + 1)
+    path_dates = calendar[:horizon]
     args_list = [
-        (i, start_price, returns_arr, horizon, stock.symbol, strategy_code, settings, block_lookahead)
-        for i in range(n_sims)
+        (sampled, start_price, path_dates, stock.symbol, strategy_code, settings, block_lookahead)
+        for sampled in all_samples
     ]
 
-    max_workers = min(n_sims, 8)
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(_run_single_path, a): a for a in args_list}
+    ex = executor if executor is not None else ThreadPoolExecutor(max_workers=min(n_sims, 8))
+    try:
+        futures = {
+            ex.submit(_run_paths, args_list[i : i + _PATHS_PER_TASK]): i
+            for i in range(0, len(args_list), _PATHS_PER_TASK)
+        }
         for future in as_completed(futures):
             try:
-                end_val, curve = future.result()
+                chunk_results = future.result()
+            except Exception as e:
+                logger.debug("Monte Carlo sims failed: %s", e)
+                errors += len(args_list[futures[future] : futures[future] + _PATHS_PER_TASK])
+                continue
+            for end_val, curve in chunk_results:
                 if end_val is not None:
                     end_values.append(end_val)
                     if curve:
                         equity_by_day.append(curve)
                 else:
                     errors += 1
-            except Exception as e:
-                logger.debug("Monte Carlo sim failed: %s", e)
-                errors += 1
+    finally:
+        if ex is not executor:
+            ex.shutdown()
 
     # Build fan chart data: percentiles at each day (include day 0 = initial)
     fan_data: list[dict] = []
     if equity_by_day:
         n_days = min(len(c) for c in equity_by_day)
-        dates = pd.date_range(
-            start=datetime.now().strftime("%Y-%m-%d"),
-            periods=n_days + 1,
-            freq="B",
+        day_strs = calendar[: n_days + 1].strftime("%Y-%m-%d")
+        fan_data.append({"day": 0, "date": day_strs[0], **dict.fromkeys(_FAN_KEYS, initial_cash)})
+        # One (n_paths, n_days) matrix and one percentile call for every day and quantile
+        eq = np.array([c[:n_days] for c in equity_by_day], dtype=float)
+        pcts = np.percentile(eq, _FAN_QUANTILES, axis=0)
+        fan_data.extend(
+            {"day": d + 1, "date": day_strs[d + 1], **dict(zip(_FAN_KEYS, row))}
+            for d, row in enumerate(pcts.T.tolist())
         )
-        fan_data.append({
-            "day": 0,
-            "date": dates[0].strftime("%Y-%m-%d"),
-            "p5": initial_cash,
-            "p25": initial_cash,
-            "p50": initial_cash,
-            "p75": initial_cash,
-            "p95": initial_cash,
-        })
-        for d in range(n_days):
-            vals = [c[d] for c in equity_by_day if d < len(c)]
-            if vals:
-                fan_data.append({
-                    "day": d + 1,
-                    "date": dates[d + 1].strftime("%Y-%m-%d") if d + 1 < len(dates) else dates[-1].strftime("%Y-%m-%d"),
-                    "p5": float(np.percentile(vals, 5)),
-                    "p25": float(np.percentile(vals, 25)),
-                    "p50": float(np.percentile(vals, 50)),
-                    "p75": float(np.percentile(vals, 75)),
-                    "p95": float(np.percentile(vals, 95)),
-                })
 
     arr = np.array(end_values)
-    p5 = float(np.percentile(arr, 5)) if len(arr) > 0 else initial_cash
-    p25 = float(np.percentile(arr, 25)) if len(arr) > 0 else initial_cash
-    p50 = float(np.percentile(arr, 50)) if len(arr) > 0 else initial_cash
-    p75 = float(np.percentile(arr, 75)) if len(arr) > 0 else initial_cash
-    p95 = float(np.percentile(arr, 95)) if len(arr) > 0 else initial_cash
+    if len(arr) > 0:
+        p5, p25, p50, p75, p95 = np.percentile(arr, _FAN_QUANTILES).tolist()
+    else:
+        p5 = p25 = p50 = p75 = p95 = initial_cash
     mean_val = float(np.mean(arr)) if len(arr) > 0 else initial_cash
     # Prob. profitable = % of paths where end value >= initial (didn't lose money)
     prob_profit = float(np.mean(arr >= initial_cash)) * 100 if len(arr) > 0 else 0.0
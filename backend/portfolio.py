@@ -1,15 +1,18 @@
 """Portfolio tracking, metrics and position management"""
+import math
+
 
 class Portfolio:
     def __init__(self):
         self._positions = {}  # symbol -> {"stock": Stock, "quantity": float (signed), "avg_price": float, "realized_pnl": float}
         self._realized = {}  # symbol -> realized pnl across all closed lots/trades
-        self.cash = 0
-        self.slippage = 0  # decimal, e.g. 0.001 = 0.1%
+        self.cash = 0.0  # always a float (add_cash/restore/clear_history coerce), so hot paths skip float()
+        self._slippage = 0  # decimal, e.g. 0.001 = 0.1%
         self.share_min_pct = 10  # min increment as % of share: 100=whole, 10=0.1, 1=0.01
-        self.commission = 0  # decimal pct (0.01 = 1%)
-        self.commission_per_order = 0.0  # $ per order
-        self.commission_per_share = 0.0  # $ per share
+        self._commission = 0  # decimal pct (0.01 = 1%)
+        self._commission_per_order = 0.0  # $ per order
+        self._commission_per_share = 0.0  # $ per share
+        self._rebuild_pricing()
         # Risk / constraints (defaults are permissive)
         self.allow_short = True
         self.max_positions = 0  # 0 => unlimited
@@ -34,34 +37,40 @@ class Portfolio:
         except Exception:
             i = None
         try:
+            n = stock.dates.size
             if i is None:
-                i = stock.df.index.size - 1
-            i = max(0, min(i, stock.df.index.size - 1))
-            if for_fill and self.fill_at_next_open and i + 1 < stock.df.index.size:
+                i = n - 1
+            i = max(0, min(i, n - 1))
+            if for_fill and self.fill_at_next_open and i + 1 < n:
                 i = i + 1
-            t = stock.df.index[i]
-            ts = t.isoformat()[:10]
+            ts = stock.iso_date(i)
         except Exception:
             ts = None
         return i, ts
 
     def _get_fill_raw_price(self, stock, index):
         """Raw price for fill. When fill_at_next_open, use next bar's open; else current close."""
+        n = stock.dates.size
         if index is None:
-            index = stock.df.index.size - 1
-        i = max(0, min(int(index), stock.df.index.size - 1))
-        if self.fill_at_next_open and i + 1 < stock.df.index.size:
-            return float(stock.df["Open"].iloc[i + 1])
-        return float(stock.price(i))
+            index = n - 1
+        i = max(0, min(int(index), n - 1))
+        if self.fill_at_next_open and i + 1 < n:
+            return float(stock.ohlc_arrays()[0][i + 1])
+        return stock.price(i)
 
     def record_equity_bar(self, index, value, time_str=None):
         """Record equity at a bar (for per-bar backtest recording)."""
         self.equity_curve.append({"i": index, "v": float(value), "time": time_str})
 
-    def _append_equity(self, value):
+    def _append_equity(self, index, prices=None, stock=None, symbol=None):
+        """Post-trade equity point. Backtests record per bar instead, so the valuation is skipped entirely.
+        prices is the pre-trade snapshot from _check_order_common; stock (the one just filled, under symbol)
+        is re-priced because the fill may have opened its position or swapped in a different Stock object."""
         if self.record_equity_per_bar:
             return
-        self.equity_curve.append({"i": len(self.trade_log), "v": value})
+        if prices is not None and stock is not None:
+            prices[symbol] = stock.price(index)
+        self.equity_curve.append({"i": len(self.trade_log), "v": self.get_value(index, prices=prices)})
 
     @property
     def stocks(self):
@@ -75,19 +84,49 @@ class Portfolio:
     def positions(self):
         return list(self._positions.values())
 
+    @property
+    def share_min_pct(self):
+        return self._share_min_pct
+
+    @share_min_pct.setter
+    def share_min_pct(self, pct):
+        # Derive the rounding increment once here rather than on every _round_qty call
+        self._share_min_pct = pct
+        self._qty_inc = float(pct or 100) / 100.0
+        self._whole_shares = self._qty_inc >= 1
+
     def _round_qty(self, qty: float) -> float:
         """Round quantity to nearest share_min_pct increment (e.g. 10% = 0.1 share)."""
-        inc = float(self.share_min_pct or 100) / 100.0
-        if inc >= 1:
+        if self._whole_shares:
             return float(round(qty))
-        return round(round(float(qty) / inc) * inc, 2)
-
-    def _slippage_factor(self, side: str) -> float:
-        """Slippage as decimal (e.g. 0.001 = 0.1%)."""
-        slip = float(self.slippage or 0)
+        return round(round(float(qty) / self._qty_inc) * self._qty_inc, 2)
+
+    # Slippage and commission settings only change through these setters (or direct assignment, which
+    # goes through the properties), so the per-fill multipliers and commission model are derived here
+    # once instead of on every _fill_price/_compute_commission call.
+    def _pricing_property(name):
+        def fset(self, value):
+            setattr(self, name, value)
+            self._rebuild_pricing()
+        return property(lambda self: getattr(self, name), fset)
+
+    slippage = _pricing_property("_slippage")
+    commission = _pricing_property("_commission")
+    commission_per_order = _pricing_property("_commission_per_order")
+    commission_per_share = _pricing_property("_commission_per_share")
+    del _pricing_property
+
+    def _rebuild_pricing(self):
+        slip = float(self._slippage or 0)
         if slip < 0 or slip >= 1:
-            raise ValueError("Slippage must be in [0, 1)")
-        return slip if side == "buy" else -slip
+            self._buy_mult = self._sell_mult = None  # rejected at fill time, as before
+        else:
+            self._buy_mult = 1 + slip
+            self._sell_mult = 1 - slip  # adverse on both sides: buys fill above the quote, sells below
+        self._per_order = float(self._commission_per_order or 0)
+        self._per_share = float(self._commission_per_share or 0)
+        self._pct = float(self._commission or 0)
+        self._per_trade_commission = self._per_order > 0 or self._per_share > 0
 
     def _fill_price(self, side, price):
         """
@@ -95,24 +134,22 @@ class Portfolio:
         Slippage is always an adverse move. 
         """
         price = float(price)
-        slip = self._slippage_factor(side)
+        if self._buy_mult is None:
+            raise ValueError("Slippage must be in [0, 1)")
         if side == "buy":
-            return price * (1 + slip)
+            return price * self._buy_mult
         if side == "sell":
-            return price * (1 - slip)
+            return price * self._sell_mult
         raise ValueError("Invalid side")
 
     def _compute_commission(self, quantity: float, notional: float) -> float:
         """
         Commission: per-order + per-share, or pct of notional if those are zero.
         """
-        per_order = float(self.commission_per_order or 0)
-        per_share = float(self.commission_per_share or 0)
-        pct = float(self.commission or 0)
-        if per_order > 0 or per_share > 0:
-            return per_order + per_share * abs(float(quantity))
-        if pct > 0:
-            return notional * pct
+        if self._per_trade_commission:
+            return self._per_order + self._per_share * abs(quantity)
+        if self._pct > 0:
+            return notional * self._pct
         return 0.0
 
     def estimate_fill_price(self, side, raw_price):
@@ -144,9 +181,17 @@ class Portfolio:
         fill = self._fill_price("buy", raw_price)
         if fill <= 0:
             return 0.0
-        max_cost = float(self.cash) * (1.0 - reserve_fraction)
-        inc = max(0.001, float(self.share_min_pct or 100) / 100.0)
-        qty = self._round_qty(max_cost / fill)
+        max_cost = self.cash * (1.0 - reserve_fraction)
+        inc = max(0.001, self._qty_inc)
+        # Solve cost(qty) = max_cost for the commission model in force (cost is linear in qty),
+        # floor to the share increment, then step down only if float error overshoots.
+        if self._per_trade_commission:
+            est = (max_cost - self._per_order) / (fill + self._per_share)
+        elif self._pct > 0:
+            est = max_cost / (fill * (1.0 + self._pct))
+        else:
+            est = max_cost / fill
+        qty = self._round_qty(min(max_cost / fill, math.floor(est / inc) * inc))
         if qty <= 0:
             return 0.0
         cost = self.estimate_buy_cost(qty, raw_price)
@@ -157,254 +202,233 @@ class Portfolio:
             cost = self.estimate_buy_cost(qty, raw_price)
         return qty if cost <= max_cost else 0.0
 
-    def _positions_view(self):
-        # symbol -> (stock, qty)
-        out = {}
-        for sym, p in self._positions.items():
-            try:
-                out[sym] = (p["stock"], float(p["quantity"]))
-            except Exception:
-                continue
-        return out
+    def _snapshot_prices(self, index=None):
+        """symbol -> close at index for every open position: one price lookup each, shared by the order checks."""
+        return {sym: p["stock"].price(index) for sym, p in self._positions.items()}
 
-    def get_short_market_value(self, index=None):
+    def get_short_market_value(self, index=None, prices=None):
         short_mv = 0.0
-        for stock, quantity in self.stocks:
-            q = float(quantity)
+        for sym, p in self._positions.items():
+            q = p["quantity"]
             if q < 0:
-                short_mv += float(stock.price(index)) * abs(q)
-        return float(short_mv)
+                px = prices[sym] if prices is not None else p["stock"].price(index)
+                short_mv += px * abs(q)
+        return short_mv
 
-    def get_reserved_cash(self, index=None):
-        equity = float(self.get_value(index))
-        short_mv = float(self.get_short_market_value(index))
-        short_reserve = float(self.short_margin_requirement) * short_mv if short_mv > 0 else 0.0
-        cash_reserve = float(self.min_cash_reserve_pct) * max(0.0, equity) if self.min_cash_reserve_pct else 0.0
-        return float(short_reserve + cash_reserve)
+    def _equity_and_short(self, index=None, prices=None):
+        """(get_value, get_short_market_value) from one pass over the positions, one price lookup each."""
+        equity = self.cash
+        short_mv = 0.0
+        for sym, p in self._positions.items():
+            q = p["quantity"]
+            px = prices[sym] if prices is not None else p["stock"].price(index)
+            equity += px * q
+            if q < 0:
+                short_mv += px * abs(q)
+        return equity, short_mv
+
+    def get_reserved_cash(self, index=None, prices=None):
+        if not self.min_cash_reserve_pct:
+            # Only shorts need collateral, so the longs are never priced (none are, for a long-only book)
+            short_mv = self.get_short_market_value(index, prices)
+            return self.short_margin_requirement * short_mv if short_mv > 0 else 0.0
+        equity, short_mv = self._equity_and_short(index, prices)
+        short_reserve = self.short_margin_requirement * short_mv if short_mv > 0 else 0.0
+        cash_reserve = self.min_cash_reserve_pct * max(0.0, equity) if self.min_cash_reserve_pct else 0.0
+        return short_reserve + cash_reserve
 
     def get_buying_power(self, index=None):
         # "Spendable" cash after reserving collateral + cash reserve.
-        bp = float(self.cash) - float(self.get_reserved_cash(index))
-        return float(bp)
+        return self.cash - self.get_reserved_cash(index)
 
-    def _reserved_cash_projected(self, *, cash_after, positions_after, index):
+    def _reserved_cash_projected(self, *, cash_after, stock, symbol, post_qty, index, prices=None):
+        """Reserve after an order moves symbol to post_qty, without copying the positions: the order's
+        symbol is valued at post_qty from the order's stock (dropped if flat, appended if new)."""
+        if prices is None:
+            prices = self._snapshot_prices(index)
         equity = float(cash_after)
         short_mv = 0.0
-        for _, (stock, qty) in positions_after.items():
-            px = float(stock.price(index))
-            equity += px * float(qty)
-            if float(qty) < 0:
-                short_mv += px * abs(float(qty))
-        short_reserve = float(self.short_margin_requirement) * float(short_mv) if short_mv > 0 else 0.0
-        cash_reserve = float(self.min_cash_reserve_pct) * max(0.0, equity) if self.min_cash_reserve_pct else 0.0
-        return float(short_reserve + cash_reserve)
-
-    def _check_order_common(self, stock, side, quantity, trade_index, raw_price, fill_price, trade_value, cost_cash_change):
+        order_px = stock.price(index)
+        for sym, p in self._positions.items():
+            if sym == symbol:
+                if post_qty == 0:
+                    continue
+                px, qty = order_px, post_qty
+            else:
+                px, qty = prices[sym], p["quantity"]
+            equity += px * qty
+            if qty < 0:
+                short_mv += px * abs(qty)
+        if symbol not in self._positions and post_qty != 0:
+            equity += order_px * post_qty
+            if post_qty < 0:
+                short_mv += order_px * abs(post_qty)
+        short_reserve = self.short_margin_requirement * short_mv if short_mv > 0 else 0.0
+        cash_reserve = self.min_cash_reserve_pct * max(0.0, equity) if self.min_cash_reserve_pct else 0.0
+        return short_reserve + cash_reserve
+
+    def _check_order_common(self, stock, symbol, side, quantity, trade_index, raw_price, fill_price, trade_value, cost_cash_change):
         if quantity <= 0:
             raise ValueError("Quantity must be positive")
-        if self.max_order_qty and float(quantity) > float(self.max_order_qty):
+        if self.max_order_qty and quantity > self.max_order_qty:
             raise ValueError(f"Order qty exceeds max_order_qty ({self.max_order_qty})")
 
-        if self.min_trade_value and float(trade_value) < float(self.min_trade_value):
+        if self.min_trade_value and trade_value < self.min_trade_value:
             raise ValueError("Trade value is below minimum")
-        if self.max_trade_value and float(trade_value) > float(self.max_trade_value):
+        if self.max_trade_value and trade_value > self.max_trade_value:
             raise ValueError("Trade value exceeds maximum")
 
-        symbol = stock.symbol.upper()
         pos = self._positions.get(symbol)
         if pos is None and self.max_positions and len(self._positions) >= int(self.max_positions):
             raise ValueError(f"Max positions reached ({self.max_positions})")
 
-        equity_pre = float(self.get_value(trade_index))
-        if self.max_position_pct and equity_pre > 0:
-            cap = float(equity_pre) * float(self.max_position_pct)
-            if float(trade_value) > cap + 1e-9:
-                raise ValueError("Trade exceeds max_position_pct cap")
-
-        if side == "buy":
-            # Keep some cash on hand after buys
-            if self.min_cash_reserve_pct and equity_pre > 0:
-                reserve = float(equity_pre) * float(self.min_cash_reserve_pct)
-                cash_after = float(self.cash) - float(trade_value)
-                if cash_after < reserve - 1e-9:
-                    raise ValueError("Trade would violate cash reserve")
-
-        # Cash check for buys/cover
-        if float(cost_cash_change) < 0:
-            need = abs(float(cost_cash_change))
-            if float(self.cash) + 1e-9 < need:
+        # Cash check for buys/cover: O(1), so it runs before anything that prices positions
+        if cost_cash_change < 0:
+            need = -cost_cash_change
+            if self.cash + 1e-9 < need:
                 raise ValueError("Not enough cash to enter position")
 
+        # Equity-relative limits need the positions priced; with neither set (the default) skip that
+        prices = None
+        if self.max_position_pct or self.min_cash_reserve_pct:
+            prices = self._snapshot_prices(trade_index)
+            equity_pre = self.get_value(trade_index, prices=prices)
+            if self.max_position_pct and equity_pre > 0:
+                cap = equity_pre * self.max_position_pct
+                if trade_value > cap + 1e-9:
+                    raise ValueError("Trade exceeds max_position_pct cap")
+
+            if side == "buy":
+                # Keep some cash on hand after buys
+                if self.min_cash_reserve_pct and equity_pre > 0:
+                    reserve = equity_pre * self.min_cash_reserve_pct
+                    cash_after = self.cash - trade_value
+                    if cash_after < reserve - 1e-9:
+                        raise ValueError("Trade would violate cash reserve")
+
         # Margin / buying power check
-        positions_after = self._positions_view()
-        cur_qty = float(positions_after.get(symbol, (stock, 0))[1])
-        delta_qty = float(quantity) if side == "buy" else -float(quantity)
+        cur_qty = pos["quantity"] if pos is not None else 0.0
+        delta_qty = quantity if side == "buy" else -quantity
         post_qty = cur_qty + delta_qty
-        if post_qty == 0:
-            positions_after.pop(symbol, None)
-        else:
-            positions_after[symbol] = (stock, post_qty)
 
-        cash_after = float(self.cash) + float(cost_cash_change)
-        reserved_after = self._reserved_cash_projected(cash_after=cash_after, positions_after=positions_after, index=trade_index)
-        buying_power_after = float(cash_after) - float(reserved_after)
+        cash_after = self.cash + cost_cash_change
+        if (
+            self.min_cash_reserve_pct
+            or post_qty < 0
+            or any(p["quantity"] < 0 for sym, p in self._positions.items() if sym != symbol)
+        ):
+            if prices is None:
+                prices = self._snapshot_prices(trade_index)
+            reserved_after = self._reserved_cash_projected(
+                cash_after=cash_after, stock=stock, symbol=symbol, post_qty=post_qty, index=trade_index, prices=prices
+            )
+        else:
+            reserved_after = 0.0  # no shorts to collateralize after this order and no cash reserve
+        buying_power_after = cash_after - reserved_after
         if buying_power_after < -1e-6:
             raise ValueError("Insufficient buying power (margin)")
+        # prices is None when nothing needed pricing (_append_equity then values positions itself);
+        # pos is the pre-trade position, handed back so the fill does not look it up again
+        return prices, pos
 
-    def enter_position_long(self, stock, quantity, index=None):
-        quantity = self._round_qty(float(quantity))
-        if (index is None):
-            index = stock.df.index.size - 1
-        trade_index, trade_time = self._trade_meta(stock, index, for_fill=True)
-        raw_price = self._get_fill_raw_price(stock, index)
-        price = self._fill_price("buy", raw_price)
-        notional = price * quantity
-        commission = self._compute_commission(quantity, notional)
-        cost = notional + commission
-        self._check_order_common(
-            stock=stock,
-            side="buy",
-            quantity=quantity,
-            trade_index=trade_index,
-            raw_price=raw_price,
-            fill_price=price,
-            trade_value=cost,
-            cost_cash_change=-cost,
-        )
-        symbol = stock.symbol.upper()
-        pos = self._positions.get(symbol)
-
-        realized = 0.0
-        if pos is None:
-            self._positions[symbol] = {"stock": stock, "quantity": quantity, "avg_price": float(price), "realized_pnl": float(self._realized.get(symbol, 0.0))}
-        else:
-            qty0 = float(pos["quantity"])
-            avg0 = float(pos["avg_price"])
-            if qty0 >= 0:
-                new_qty = qty0 + quantity
-                new_avg = ((avg0 * qty0) + (price * quantity)) / new_qty if new_qty else 0.0
-                pos["stock"] = stock
-                pos["quantity"] = new_qty
-                pos["avg_price"] = float(new_avg)
-            else:
-                cover_qty = min(quantity, abs(qty0))
-                realized = (avg0 - price) * cover_qty
-                remaining = quantity - cover_qty
-                new_qty = qty0 + cover_qty
-                if new_qty == 0 and remaining == 0:
-                    self._positions.pop(symbol, None)
-                else:
-                    if new_qty == 0 and remaining > 0:
-                        pos["stock"] = stock
-                        pos["quantity"] = remaining
-                        pos["avg_price"] = float(price)
-                    else:
-                        pos["stock"] = stock
-                        pos["quantity"] = new_qty
-                pos = self._positions.get(symbol)
-                if pos is not None:
-                    pos["realized_pnl"] = float(self._realized.get(symbol, 0.0) + realized)
-        if realized != 0.0:
-            self._realized[symbol] = float(self._realized.get(symbol, 0.0) + realized)
-            if symbol in self._positions:
-                self._positions[symbol]["realized_pnl"] = float(self._realized.get(symbol, 0.0))
-
-        self.trade_log.append({
-            'type': 'long',
-            'stock': stock.symbol,
-            'quantity': quantity,
-            'price': float(raw_price),
-            'fill_price': float(price),
-            'cost': float(cost),
-            'commission': float(commission),
-            'realized_pnl': float(realized),
-            'index': int(trade_index) if trade_index is not None else None,
-            'time': trade_time,
-        })
-        self.cash -= cost
-        self._append_equity(self.get_value(trade_index))
-
-    def enter_position_short(self, stock, quantity, index=None):
+    def _enter_position(self, stock, quantity, index, side):
+        """
+        Shared fill path for enter_position_long (side "buy") and enter_position_short (side "sell"):
+        adds to a same-side position, or covers/reduces the opposite side and flips any remainder.
+        """
+        buy = side == "buy"
+        sign = 1.0 if buy else -1.0
         quantity = self._round_qty(float(quantity))
         if (index is None):
-            index = stock.df.index.size - 1
+            index = stock.dates.size - 1
         trade_index, trade_time = self._trade_meta(stock, index, for_fill=True)
-        if not self.allow_short:
+        if not buy and not self.allow_short:
             raise ValueError("Short selling is disabled")
         raw_price = self._get_fill_raw_price(stock, index)
-        price = self._fill_price("sell", raw_price)
+        price = self._fill_price(side, raw_price)
         notional = price * quantity
         commission = self._compute_commission(quantity, notional)
-        proceeds = notional - commission
-        self._check_order_common(
+        if buy:
+            amount_key, amount = "cost", notional + commission
+            trade_value, cash_change = amount, -amount
+        else:
+            amount_key, amount = "proceeds", notional - commission
+            trade_value, cash_change = notional, amount
+        symbol = stock.symbol.upper()
+        prices, pos = self._check_order_common(
             stock=stock,
-            side="sell",
+            symbol=symbol,
+            side=side,
             quantity=quantity,
             trade_index=trade_index,
             raw_price=raw_price,
             fill_price=price,
-            trade_value=notional,
-            cost_cash_change=proceeds,
+            trade_value=trade_value,
+            cost_cash_change=cash_change,
         )
-        symbol = stock.symbol.upper()
-        pos = self._positions.get(symbol)
 
         realized = 0.0
         if pos is None:
-            self._positions[symbol] = {"stock": stock, "quantity": -quantity, "avg_price": float(price), "realized_pnl": float(self._realized.get(symbol, 0.0))}
+            self._positions[symbol] = {"stock": stock, "quantity": sign * quantity, "avg_price": price, "realized_pnl": self._realized.get(symbol, 0.0)}
         else:
-            qty0 = float(pos["quantity"])
-            avg0 = float(pos["avg_price"])
-            if qty0 <= 0:
-                new_qty = qty0 - quantity
-                old_abs = abs(qty0)
+            qty0 = pos["quantity"]
+            avg0 = pos["avg_price"]
+            if (qty0 >= 0) if buy else (qty0 <= 0):
+                # Same side (or flat): blend the average price over absolute size
+                new_qty = qty0 + sign * quantity
                 new_abs = abs(new_qty)
-                new_avg = ((avg0 * old_abs) + (price * quantity)) / new_abs if new_abs else 0.0
+                new_avg = ((avg0 * abs(qty0)) + (price * quantity)) / new_abs if new_abs else 0.0
                 pos["stock"] = stock
                 pos["quantity"] = new_qty
-                pos["avg_price"] = float(new_avg)
+                pos["avg_price"] = new_avg
             else:
-                sell_qty = min(quantity, qty0)
-                realized = (price - avg0) * sell_qty
-                remaining = quantity - sell_qty
-                new_qty = qty0 - sell_qty
+                # Opposite side: close up to the open size, realize P&L, flip with any remainder
+                closed = min(quantity, abs(qty0))
+                realized = ((avg0 - price) if buy else (price - avg0)) * closed
+                remaining = quantity - closed
+                new_qty = qty0 + sign * closed
                 if new_qty == 0 and remaining == 0:
                     self._positions.pop(symbol, None)
+                    pos = None
                 else:
                     if new_qty == 0 and remaining > 0:
                         pos["stock"] = stock
-                        pos["quantity"] = -remaining
-                        pos["avg_price"] = float(price)
+                        pos["quantity"] = sign * remaining
+                        pos["avg_price"] = price
                     else:
                         pos["stock"] = stock
                         pos["quantity"] = new_qty
-                pos = self._positions.get(symbol)
-                if pos is not None:
-                    pos["realized_pnl"] = float(self._realized.get(symbol, 0.0) + realized)
-        if realized != 0.0:
-            self._realized[symbol] = float(self._realized.get(symbol, 0.0) + realized)
-            if symbol in self._positions:
-                self._positions[symbol]["realized_pnl"] = float(self._realized.get(symbol, 0.0))
+        if realized:
+            total = self._realized.get(symbol, 0.0) + realized
+            self._realized[symbol] = total
+            if pos is not None:
+                pos["realized_pnl"] = total
 
         self.trade_log.append({
-            'type': 'short',
+            'type': 'long' if buy else 'short',
             'stock': stock.symbol,
             'quantity': quantity,
             'price': float(raw_price),
             'fill_price': float(price),
-            'proceeds': float(proceeds),
+            amount_key: float(amount),
             'commission': float(commission),
             'realized_pnl': float(realized),
             'index': int(trade_index) if trade_index is not None else None,
             'time': trade_time,
         })
-        self.cash += proceeds
-        self._append_equity(self.get_value(trade_index))
+        self.cash += cash_change
+        self._append_equity(trade_index, prices, stock, symbol)
+
+    def enter_position_long(self, stock, quantity, index=None):
+        self._enter_position(stock, quantity, index, "buy")
+
+    def enter_position_short(self, stock, quantity, index=None):
+        self._enter_position(stock, quantity, index, "sell")
 
     def exit_position(self, stock, quantity, index=None):
         quantity = self._round_qty(float(quantity))
         if (index is None):
-            index = stock.df.index.size - 1
+            index = stock.dates.size - 1
         trade_index, trade_time = self._trade_meta(stock, index, for_fill=True)
         raw_price = self._get_fill_raw_price(stock, index)
         if quantity <= 0:
@@ -413,10 +437,10 @@ class Portfolio:
         pos = self._positions.get(symbol)
         if pos is None:
             raise ValueError("Stock not found in portfolio")
-        qty0 = float(pos["quantity"])
+        qty0 = pos["quantity"]
         if quantity > abs(qty0):
             raise ValueError("Quantity exceeds position size")
-        avg0 = float(pos["avg_price"])
+        avg0 = pos["avg_price"]
 
         if qty0 > 0:
             fill = self._fill_price("sell", raw_price)
@@ -437,8 +461,9 @@ class Portfolio:
 
         pos["stock"] = stock
         pos["quantity"] = new_qty
-        self._realized[symbol] = float(self._realized.get(symbol, 0.0) + realized)
-        pos["realized_pnl"] = float(self._realized.get(symbol, 0.0))
+        total = self._realized.get(symbol, 0.0) + realized
+        self._realized[symbol] = total
+        pos["realized_pnl"] = total
         if new_qty == 0:
             self._positions.pop(symbol, None)
 
@@ -454,17 +479,22 @@ class Portfolio:
             'index': int(trade_index) if trade_index is not None else None,
             'time': trade_time,
         })
-        self._append_equity(self.get_value(trade_index))
+        self._append_equity(trade_index)
 
-    def get_value(self, index=None):
+    def get_value(self, index=None, prices=None):
+        # Called once per bar by Backtest.run: without a snapshot, price inline rather than build a dict.
+        # (A NumPy dot over the positions loses at these sizes: the per-call array builds cost more than the loop.)
         value = self.cash
-        for stock, quantity in self.stocks:
-            idx = index if index is not None else stock.df.index.size - 1
-            value += float(stock.price(idx)) * float(quantity)
+        if prices is not None:
+            for sym, p in self._positions.items():
+                value += prices[sym] * p["quantity"]
+        else:
+            for p in self._positions.values():
+                value += p["stock"].price(index) * p["quantity"]
         return value
 
     def add_cash(self, amount):
-        self.cash += amount
+        self.cash += float(amount)
 
     def restore_from_state(self, cash: float, positions_data: list, trade_log: list, equity_curve: list, realized: dict, get_stock):
         """Restore portfolio from persisted state. get_stock(symbol) returns Stock instance."""
@@ -539,6 +569,6 @@ class Portfolio:
         """Reset portfolio: clear positions, trade log, equity curve; set cash to initial."""
         self._positions = {}
         self._realized = {}
-        self.cash = initial_cash
+        self.cash = float(initial_cash)
         self.trade_log = []
         self.equity_curve = []
\ No newline at end of file
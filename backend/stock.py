@@ -1,16 +1,26 @@
 """Stock data"""
 
 import logging
-from datetime import datetime, timedelta
-from typing import List, Optional, Tuple, Union
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 
-from data_provider import get_ohlc
+try:
+    import bottleneck as bn
+except ImportError:  # windowed stats fall back to sliding_window_view reductions
+    bn = None
+
+from data_provider import get_ohlc, get_ohlc_many
+from indicators_core import adx_kernel, ewm_adjust_false
 
 logger = logging.getLogger(__name__)
 
+_EPOCH = date(1970, 1, 1)
+_NS_PER_DAY = 86_400_000_000_000
+
 
 def make_minimal_stock(symbol: str = "AAPL") -> "Stock":
     """Create a minimal Stock for validation (no Yahoo fetch). Avoids timeouts on save."""
@@ -23,14 +33,51 @@ def make_minimal_stock(symbol: str = "AAPL") -> "Stock":
     return Stock(symbol, df=df)
 
 
-def _safe_float_for_json(x: float) -> Optional[float]:
-    """Convert values for use in JSONs"""
-    if pd.isna(x) or (isinstance(x, float) and np.isnan(x)):
-        return None
-    return float(x)
+def default_date_range(start_date: Optional[str], end_date: Optional[str]) -> Tuple[str, str]:
+    """Fill in the default history window: 30 years up to today."""
+    if not end_date:
+        end_date = datetime.now().strftime("%Y-%m-%d")
+    if not start_date:
+        start_date = (datetime.now() - timedelta(days=365 * 30)).strftime("%Y-%m-%d")
+    return start_date, end_date
+
+
+def _move_mean(x: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over window (NaN until full); bottleneck rejects windows longer than x."""
+    if window < 1 or window > x.size:
+        return np.full(x.size, np.nan)
+    if bn is not None:
+        return bn.move_mean(x, window, min_count=window)
+    out = np.full(x.size, np.nan)
+    out[window - 1 :] = sliding_window_view(x, window).mean(axis=1)
+    return out
+
+
+def _move_std(x: np.ndarray, window: int) -> np.ndarray:
+    """Trailing sample std (ddof=1) over window, matching pandas rolling().std()."""
+    if window < 1 or window > x.size:
+        return np.full(x.size, np.nan)
+    if bn is not None:
+        return bn.move_std(x, window, min_count=window, ddof=1)
+    out = np.full(x.size, np.nan)
+    if window > 1:
+        out[window - 1 :] = sliding_window_view(x, window).std(axis=1, ddof=1)
+    return out
+
+
+def nan_to_none(values: np.ndarray) -> list:
+    """ndarray -> nested Python list with NaN replaced by None (JSON-safe)."""
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
 
 
 class Stock:
+    # dtype of the cached OHLC arrays that indicators run on. float32 halves memory traffic and
+    # keeps RSI/ATR/ADX within ~1e-4 relative, but fills are priced from the same arrays, so
+    # float64 stays the default to keep cash accounting exact to the cent.
+    DTYPE = np.float64
+
     def __init__(
         self,
         symbol: str,
@@ -39,21 +86,19 @@ class Stock:
         df: Optional[pd.DataFrame] = None,
     ):
         self.symbol = symbol.upper().strip()
-        self._tr_cache: Optional[pd.Series] = None
+        self._adx_cache: dict = {}
+        self._indicator_cache: dict = {}
 
         if df is not None:
             self.df = df.copy()
             self.df.index = pd.to_datetime(self.df.index)
             self.df = self.df.sort_index()
         else:
-            if not end_date:
-                end_date = datetime.now().strftime("%Y-%m-%d")
-            if not start_date:
-                start_date = (datetime.now() - timedelta(days=365 * 30)).strftime("%Y-%m-%d")
-
+            start_date, end_date = default_date_range(start_date, end_date)
             self.df = get_ohlc(self.symbol, start_date, end_date)
             if self.df.empty:
                 logger.warning("No data for %s", self.symbol)
+                self._cache_columns()
                 return
 
             self.df.index = pd.to_datetime(self.df.index)
@@ -64,165 +109,282 @@ class Stock:
             if col in self.df.columns:
                 self.df[col] = pd.to_numeric(self.df[col], errors="coerce")
         self.df = self.df.dropna(subset=["Open", "High", "Low", "Close"])
+        self._cache_columns()
+
+    @classmethod
+    def from_arrays(
+        cls,
+        symbol: str,
+        dates: pd.DatetimeIndex,
+        open: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+    ) -> "Stock":
+        """
+        Build a Stock straight from sorted, NaN-free OHLC arrays (e.g. synthetic Monte Carlo paths).
+        Skips the DataFrame round-trip; df is only assembled if something reads it.
+        """
+        self = cls.__new__(cls)
+        self.symbol = symbol.upper().strip()
+        self._adx_cache = {}
+        self._indicator_cache = {}
+        self._df = None
+        self._open, self._high, self._low, self._close = (
+            np.ascontiguousarray(a, dtype=cls.DTYPE) for a in (open, high, low, close)
+        )
+        self._ohlc = np.column_stack((self._open, self._high, self._low, self._close))
+        self._set_dates(pd.DatetimeIndex(dates))
+        return self
+
+    @property
+    def df(self) -> pd.DataFrame:
+        if self._df is None:
+            self._df = pd.DataFrame(
+                {"Open": self._open, "High": self._high, "Low": self._low, "Close": self._close},
+                index=self.dates,
+            )
+        return self._df
+
+    @df.setter
+    def df(self, value: pd.DataFrame) -> None:
+        self._df = value
+
+    def __getstate__(self) -> dict:
+        # Pickled when shipped to backtest worker processes: send OHLC only, indicators are rebuilt on demand.
+        state = self.__dict__.copy()
+        state["_adx_cache"] = {}
+        state["_indicator_cache"] = {}
+        state.pop("_ohlc", None)  # derived from the column arrays; rebuilt in __setstate__
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._ohlc = np.column_stack((self._open, self._high, self._low, self._close))
+
+    @classmethod
+    def bulk(
+        cls,
+        symbols: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> Dict[str, "Stock"]:
+        """Load several symbols with one batched download. Symbols without data are omitted."""
+        start_date, end_date = default_date_range(start_date, end_date)
+        frames = get_ohlc_many(symbols, start_date, end_date)
+        return {sym: cls(sym, df=df) for sym, df in frames.items() if not df.empty}
+
+    def _cache_columns(self) -> None:
+        """Keep DTYPE ndarrays of OHLC so hot paths skip pandas column access (df is not mutated after init)."""
+        self._open, self._high, self._low, self._close = (
+            self.df[c].to_numpy(dtype=self.DTYPE) if c in self.df.columns else np.empty(0, dtype=self.DTYPE)
+            for c in ("Open", "High", "Low", "Close")
+        )
+        # Row-major (N, 4) copy: one contiguous 4-value row per bar for get_candle; the column arrays
+        # above stay separate because the indicator kernels want contiguous single-column input.
+        self._ohlc = np.column_stack((self._open, self._high, self._low, self._close))
+        self._set_dates(self.df.index)
+
+    def _set_dates(self, index: pd.Index) -> None:
+        self.dates = index
+        self._n_bars = len(index)
+        self._index_i8 = index.as_unit("ns").asi8 if isinstance(index, pd.DatetimeIndex) else np.empty(0, dtype=np.int64)
+        # tz-naive: the int64 values are wall-clock, so iso_date can derive the day without a Timestamp
+        self._naive_dates = isinstance(index, pd.DatetimeIndex) and index.tz is None
+
+    def iso_date(self, i: int) -> Optional[str]:
+        """YYYY-MM-DD label of bar i (None if the index holds no dates)."""
+        if self._naive_dates:
+            return (_EPOCH + timedelta(days=self._index_i8.item(i) // _NS_PER_DAY)).isoformat()
+        try:
+            return self.dates[i].isoformat()[:10]
+        except Exception:
+            return None
+
+    # Indicators: _*_array methods return ndarrays (NaN during warmup);
+    # the public methods convert to lists with None, which is what strategies index into,
+    # or given index= return just that bar's value (no per-bar copy of the whole series).
+    def _cached(self, key: tuple, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """Memoize an indicator array per (name, params). OHLC never changes after init, so no invalidation."""
+        arr = self._indicator_cache.get(key)
+        if arr is None:
+            arr = compute()
+            arr.flags.writeable = False  # shared across callers (Stock objects are cached in the API)
+            self._indicator_cache[key] = arr
+        return arr
+
+    def _listed(self, key: tuple, build: Callable[[], list]) -> list:
+        """
+        Public indicator list, None-filled once per (name, params) and then handed out as a shallow copy.
+        Strategies typically call e.g. sma(20)[index] on every bar; copying a list of immutable floats is a
+        fraction of re-boxing the whole array each time, and callers still cannot corrupt the cache.
+        """
+        key = ("list",) + key
+        cached = self._indicator_cache.get(key)
+        if cached is None:
+            cached = self._indicator_cache[key] = build()
+        return cached.copy()
+
+    def _value_at(self, arr: np.ndarray, index: Union[int, str]):
+        """One bar of an indicator array, None-filled like the public lists (a tuple per row for 2-D)."""
+        i = self.to_iloc(index)
+        if arr.ndim == 1:
+            v = arr.item(i)
+            return None if v != v else v
+        return tuple(None if v != v else v for v in arr[i].tolist())
+
+    def _rsi_array(self, period: int = 14) -> np.ndarray:
+        return self._cached(("rsi", period), lambda: self._compute_rsi(period))
+
+    def _compute_rsi(self, period: int) -> np.ndarray:
+        close = self._close
+        if close.size == 0:
+            return np.empty(0)
+        delta = np.diff(close, prepend=close[0])
+        gain = np.maximum(delta, 0.0)
+        loss = np.maximum(-delta, 0.0)
+        avg_gain = ewm_adjust_false(gain, 1.0 / period)
+        avg_loss = ewm_adjust_false(loss, 1.0 / period)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi_arr = np.where(avg_loss > 0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss), 100.0)
+        rsi_arr[:period] = np.nan
+        return rsi_arr
 
-    # Indicators
-    def rsi(self, period: int = 14) -> List[Optional[float]]:
-        close = self.df["Close"]
-        delta = close.diff()
-        gain = delta.where(delta > 0, 0.0)
-        loss = (-delta).where(delta < 0, 0.0)
-        avg_gain = gain.ewm(alpha=1 / period, adjust=False).mean()
-        avg_loss = loss.ewm(alpha=1 / period, adjust=False).mean()
-        rs = avg_gain / avg_loss
-        rsi_series = 100 - (100 / (1 + rs))
-        rsi_series = rsi_series.where(avg_loss > 0, 100.0)
-        rsi_series.iloc[:period] = np.nan
-        return [_safe_float_for_json(x) for x in rsi_series.tolist()]
-
-    def sma(self, period: int = 14) -> List[Optional[float]]:
-        s = self.df["Close"].rolling(window=period).mean()
-        return [_safe_float_for_json(x) for x in s.tolist()]
-
-    def ema(self, period: int = 14) -> List[Optional[float]]:
-        s = self.df["Close"].ewm(span=period, adjust=False).mean()
-        return [_safe_float_for_json(x) for x in s.tolist()]
+    def _sma_array(self, period: int = 14) -> np.ndarray:
+        return self._cached(("sma", period), lambda: _move_mean(self._close, period))
+
+    def _ema_array(self, period: int = 14) -> np.ndarray:
+        return self._cached(("ema", period), lambda: ewm_adjust_false(self._close, 2.0 / (period + 1)))
+
+    def _macd_array(self, long_period: int = 26, short_period: int = 12) -> np.ndarray:
+        def compute() -> np.ndarray:
+            macd_arr = self._ema_array(short_period) - self._ema_array(long_period)
+            macd_arr[:long_period] = np.nan
+            return macd_arr
+
+        return self._cached(("macd", long_period, short_period), compute)
+
+    def _bollinger_array(self, period: int = 20, dev: float = 2) -> np.ndarray:
+        """(N, 3) array of upper, middle, lower."""
+        def compute() -> np.ndarray:
+            middle = self._sma_array(period)
+            std = _move_std(self._close, period)
+            return np.column_stack((middle + dev * std, middle, middle - dev * std))
+
+        return self._cached(("bollinger", period, dev), compute)
+
+    def rsi(
+        self,
+        period: int = 14,
+        index: Optional[Union[int, str]] = None,
+    ) -> Union[List[Optional[float]], Optional[float]]:
+        if index is not None:
+            return self._value_at(self._rsi_array(period), index)
+        return self._listed(("rsi", period), lambda: nan_to_none(self._rsi_array(period)))
+
+    def sma(
+        self,
+        period: int = 14,
+        index: Optional[Union[int, str]] = None,
+    ) -> Union[List[Optional[float]], Optional[float]]:
+        if index is not None:
+            return self._value_at(self._sma_array(period), index)
+        return self._listed(("sma", period), lambda: nan_to_none(self._sma_array(period)))
+
+    def ema(
+        self,
+        period: int = 14,
+        index: Optional[Union[int, str]] = None,
+    ) -> Union[List[Optional[float]], Optional[float]]:
+        if index is not None:
+            return self._value_at(self._ema_array(period), index)
+        return self._listed(("ema", period), lambda: nan_to_none(self._ema_array(period)))
 
     def macd(
         self,
         long_period: int = 26,
         short_period: int = 12,
-    ) -> List[Optional[float]]:
-        short_ema = self.df["Close"].ewm(span=short_period, adjust=False).mean()
-        long_ema = self.df["Close"].ewm(span=long_period, adjust=False).mean()
-        macd_series = short_ema - long_ema
-        macd_series.iloc[:long_period] = np.nan
-        return [_safe_float_for_json(x) for x in macd_series.tolist()]
+        index: Optional[Union[int, str]] = None,
+    ) -> Union[List[Optional[float]], Optional[float]]:
+        if index is not None:
+            return self._value_at(self._macd_array(long_period, short_period), index)
+        return self._listed(
+            ("macd", long_period, short_period), lambda: nan_to_none(self._macd_array(long_period, short_period))
+        )
 
     def bollinger_bands(
         self,
         period: int = 20,
         dev: float = 2,
-    ) -> List[Tuple[Optional[float], Optional[float], Optional[float]]]:
-        close = self.df["Close"]
-        middle = close.rolling(window=period).mean()
-        std = close.rolling(window=period).std()
-        upper = middle + dev * std
-        lower = middle - dev * std
-        return [
-            (
-                _safe_float_for_json(u),
-                _safe_float_for_json(m),
-                _safe_float_for_json(l),
-            )
-            for u, m, l in zip(upper.tolist(), middle.tolist(), lower.tolist())
-        ]
-
-    def _tr_series(self) -> pd.Series:
-        if self._tr_cache is not None:
-            return self._tr_cache
-        high = self.df["High"]
-        low = self.df["Low"]
-        prev_close = self.df["Close"].shift(1)
-        hl = high - low
-        hc = (high - prev_close).abs()
-        lc = (low - prev_close).abs()
-        tr = pd.concat([hl, hc, lc], axis=1).max(axis=1)
-        tr.iloc[0] = hl.iloc[0]
-        self._tr_cache = tr
-        return tr
+        index: Optional[Union[int, str]] = None,
+    ) -> Union[List[Tuple[Optional[float], ...]], Tuple[Optional[float], ...]]:
+        if index is not None:
+            return self._value_at(self._bollinger_array(period, dev), index)
+        return self._listed(
+            ("bollinger", period, dev),
+            lambda: [tuple(row) for row in nan_to_none(self._bollinger_array(period, dev))],
+        )
+
+    def _adx_arrays(self, period: int = 14) -> Tuple[np.ndarray, ...]:
+        """(tr, plus_dm, minus_dm, atr, pdi, mdi, dx, adx) from one fused pass, cached per period."""
+        cached = self._adx_cache.get(period)
+        if cached is None:
+            cached = adx_kernel(self._high, self._low, self._close, period)
+            for arr in cached:
+                arr.flags.writeable = False
+            self._adx_cache[period] = cached
+        return cached
 
     def tr(self, index: Optional[Union[int, str]] = None) -> float:
         i = self.to_iloc(index)
-        if i == 0:
-            return float(self.df["High"].iloc[0] - self.df["Low"].iloc[0])
-        return float(self._tr_series().iloc[i])
-
-    def atr(self, period: int = 14) -> List[Optional[float]]:
-        tr = self._tr_series()
-        tr_from_period = pd.concat([
-            pd.Series([tr.iloc[1 : period + 1].mean()], index=[tr.index[period]]),
-            tr.iloc[period + 1 :],
-        ])
-        atr_smoothed = tr_from_period.ewm(alpha=1 / period, adjust=False).mean()
-        atr_series = pd.Series(np.nan, index=tr.index)
-        atr_series.iloc[period:] = atr_smoothed.values
-        return [_safe_float_for_json(x) for x in atr_series.tolist()]
-
-    def _dm(self) -> Tuple[pd.Series, pd.Series]:
-        high = self.df["High"]
-        low = self.df["Low"]
-        up = high.diff()
-        down = -low.diff()
-        plus_dm = up.where((up > down) & (up > 0), 0.0)
-        minus_dm = down.where((down > up) & (down > 0), 0.0)
-        plus_dm.iloc[0] = 0
-        minus_dm.iloc[0] = 0
-        return plus_dm, minus_dm
+        return float(self._adx_arrays()[0][i])
+
+    def atr(
+        self,
+        period: int = 14,
+        index: Optional[Union[int, str]] = None,
+    ) -> Union[List[Optional[float]], Optional[float]]:
+        if index is not None:
+            return self._value_at(self._adx_arrays(period)[3], index)
+        return self._listed(("atr", period), lambda: nan_to_none(self._adx_arrays(period)[3]))
 
     def dm(self) -> Tuple[List[float], List[float]]:
-        plus_dm, minus_dm = self._dm()
-        return (plus_dm.fillna(0).tolist(), minus_dm.fillna(0).tolist())
-
-    def adx(self, period: int = 14) -> List[Optional[float]]:
-        atr_list = self.atr(period)
-        atr_vals = np.array([(x if x is not None else np.nan) for x in atr_list], dtype=float)
-        plus_dm, minus_dm = self._dm()
-        alpha = 1 / period
-        sp_init = pd.Series(
-            [plus_dm.iloc[1 : period + 1].mean()],
-            index=[plus_dm.index[period]],
-        )
-        sm_init = pd.Series(
-            [minus_dm.iloc[1 : period + 1].mean()],
-            index=[minus_dm.index[period]],
-        )
-        smooth_plus = pd.concat([sp_init, plus_dm.iloc[period + 1 :]]).ewm(
-            alpha=alpha, adjust=False
-        ).mean()
-        smooth_minus = pd.concat([sm_init, minus_dm.iloc[period + 1 :]]).ewm(
-            alpha=alpha, adjust=False
-        ).mean()
-        sp = np.zeros(len(atr_vals))
-        sm = np.zeros(len(atr_vals))
-        sp[period:] = smooth_plus.values
-        sm[period:] = smooth_minus.values
-        pdi = np.where(atr_vals > 0, 100 * sp / atr_vals, 0)
-        mdi = np.where(atr_vals > 0, 100 * sm / atr_vals, 0)
-        di_sum = pdi + mdi
-        dx = np.where(di_sum > 0, 100 * np.abs(pdi - mdi) / di_sum, 0)
-        dx[:period] = np.nan
-        adx_init = pd.Series([np.nanmean(dx[period : 2 * period])])
-        adx_smoothed = pd.concat([adx_init, pd.Series(dx[2 * period :])]).ewm(
-            alpha=alpha, adjust=False
-        ).mean()
-        adx_series = np.full(len(atr_vals), np.nan)
-        adx_series[2 * period - 1] = adx_smoothed.iloc[0]
-        adx_series[2 * period :] = adx_smoothed.values[1:]
-        return [_safe_float_for_json(x) for x in adx_series.tolist()]
+        # TR and DM do not depend on period; reuse the default-period pass.
+        _, plus_dm, minus_dm = self._adx_arrays()[:3]
+        return (plus_dm.tolist(), minus_dm.tolist())
+
+    def adx(
+        self,
+        period: int = 14,
+        index: Optional[Union[int, str]] = None,
+    ) -> Union[List[Optional[float]], Optional[float]]:
+        if index is not None:
+            return self._value_at(self._adx_arrays(period)[7], index)
+        return self._listed(("adx", period), lambda: nan_to_none(self._adx_arrays(period)[7]))
 
     # Data access
     def to_iloc(self, index: Optional[Union[int, str]] = None) -> int:
         """convert given index to integer location index"""
+        n = self._n_bars
+        if type(index) is int and 0 <= index < n:  # per-bar fast path: already a valid position
+            return index
         if index is None:
-            return self.df.index.size - 1
+            return n - 1
         if isinstance(index, (int, np.integer)):
-            return min(max(0, int(index)), self.df.index.size - 1)
-        date = pd.Timestamp(index)
-        i = self.df.index.get_indexer([date], method="ffill")[0]
-        return max(0, min(i, self.df.index.size - 1))
+            return min(max(0, int(index)), n - 1)
+        # Index is sorted; last bar at or before date (same as get_indexer(method="ffill")).
+        i = int(np.searchsorted(self._index_i8, pd.Timestamp(index).value, side="right")) - 1
+        return max(0, min(i, n - 1))
+
+    def ohlc_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Contiguous (open, high, low, close) ndarrays for whole-history loops; treat as read-only."""
+        return self._open, self._high, self._low, self._close
 
     def get_candle(
         self,
         index: Optional[Union[int, str]] = None,
     ) -> Tuple[float, float, float, float]:
-        i = self.to_iloc(index)
-        return (
-            float(self.df["Open"].iloc[i]),
-            float(self.df["High"].iloc[i]),
-            float(self.df["Low"].iloc[i]),
-            float(self.df["Close"].iloc[i]),
-        )
+        return tuple(self._ohlc[self.to_iloc(index)].tolist())
 
     def price(self, index: Optional[Union[int, str]] = None) -> float:
-        i = self.to_iloc(index)
-        return float(self.df["Close"].iloc[i])
+        return self._close.item(self.to_iloc(index))
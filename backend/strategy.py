@@ -1,8 +1,31 @@
+import threading
+from contextlib import contextmanager
+
+# Per-thread list that Strategy subclasses append themselves to while user code is exec'd.
+_collector = threading.local()
+
+
+@contextmanager
+def collect_subclasses():
+    """Yield a list that receives every Strategy subclass defined in this thread inside the block."""
+    _collector.classes = classes = []
+    try:
+        yield classes
+    finally:
+        _collector.classes = None
+
+
 class Strategy:
     """
     Base class for a backtest strategy. Start, update and end are the three main methods to use. 
     """
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        classes = getattr(_collector, "classes", None)
+        if classes is not None:
+            classes.append(cls)
+
     def __init__(self, stock, portfolio):
         self.stock = stock
         self.portfolio = portfolio
@@ -17,6 +40,15 @@ class Strategy:
         """
         pass
 
+    def signals(self):
+        """
+        Optional vectorized alternative to update(). Return (entries, exits, sizes), each one value per bar
+        of self.stock (sequences or arrays; sizes may be a single number), or None to use update().
+        On an entry bar a flat portfolio buys sizes[i] shares; on an exit bar the open position is closed.
+        Orders the portfolio rejects are skipped. As in update(), bar i may only depend on data up to i.
+        """
+        return None
+
     def end(self, candle=None):
         """Called once at the end of the backtest."""
         pass
\ No newline at end of file
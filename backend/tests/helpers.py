@@ -0,0 +1,17 @@
+"""Test data builders shared across test modules."""
+import numpy as np
+import pandas as pd
+
+from stock import Stock
+
+
+def random_stock(n: int = 500, seed: int = 7) -> Stock:
+    """Seeded random-walk OHLCV series starting 2015-01-02 on business days."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.01, n))
+    open_ = close * (1 + rng.normal(0, 0.003, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.004, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.004, n)))
+    dates = pd.bdate_range("2015-01-02", periods=n)
+    df = pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close, "Volume": 1e6}, index=dates)
+    return Stock("TEST", df=df)
@@ -0,0 +1,55 @@
+"""Report metrics on small hand-checked equity curves and trade logs."""
+import pandas as pd
+import pytest
+
+from analytics import _expand_equity_to_daily, compute_equity_metrics, compute_trade_metrics
+
+
+def _curve(values, start="2024-01-01"):
+    dates = pd.bdate_range(start, periods=len(values))
+    return [{"i": i, "v": v, "time": d.strftime("%Y-%m-%d")} for i, (v, d) in enumerate(zip(values, dates))]
+
+
+def test_drawdown_depth_and_duration():
+    m = compute_equity_metrics(_curve([100, 120, 90, 110, 80, 130]), 100)
+    assert m["max_drawdown"] == pytest.approx(-1 / 3)
+    assert m["max_drawdown_duration"] == 3  # peak at bar 1, trough at bar 4
+    assert m["drawdown_series"] == pytest.approx([0, 0, -0.25, -1 / 12, -1 / 3, 0])
+    assert m["peak_value"] == 130 and m["low_value"] == 80
+
+
+def test_empty_curve_uses_initial_cash():
+    m = compute_equity_metrics([], 5000)
+    assert m["start_value"] == m["end_value"] == 5000
+    assert m["max_drawdown"] == 0.0 and m["sharpe_annual"] == 0.0
+    assert m["drawdown_series"] == [0.0]
+
+
+def test_expand_to_daily_forward_fills_business_days():
+    points = [
+        {"i": 0, "v": 100.0, "time": "2024-01-03"},  # Wed
+        {"i": 1, "v": 101.0, "time": "2024-01-03"},  # same day: last one wins
+        {"i": 2, "v": 90.0, "time": "2024-01-06"},  # Sat: not a business day, dropped
+        {"i": 3, "v": 110.0, "time": "2024-01-09"},  # Tue
+    ]
+    values, dates = _expand_equity_to_daily(points, 1.0)
+    assert dates == ["2024-01-03", "2024-01-04", "2024-01-05", "2024-01-08", "2024-01-09"]
+    assert values == [101.0, 101.0, 101.0, 101.0, 110.0]
+
+
+def test_trade_metrics_aggregates_exits():
+    log = [
+        {"type": "long", "realized_pnl": 0.0, "cost": 1000.0},
+        {"type": "exit", "realized_pnl": 50.0, "amount": 1050.0},
+        {"type": "short", "realized_pnl": 0.0, "proceeds": 500.0},
+        {"type": "exit", "realized_pnl": -20.0, "amount": -520.0},
+        {"type": "exit", "realized_pnl": 30.0, "amount": 300.0},
+    ]
+    m = compute_trade_metrics(log)
+    assert (m["trades"], m["exits"], m["wins"], m["losses"]) == (5, 3, 2, 1)
+    assert m["gross_profit"] == 80.0 and m["gross_loss"] == -20.0
+    assert m["net_realized_exits"] == 60.0 and m["net_realized_all"] == 60.0
+    assert m["avg_win"] == 40.0 and m["max_win"] == 50.0 and m["max_loss"] == -20.0
+    assert m["profit_factor"] == 4.0
+    assert m["win_rate"] == pytest.approx(2 / 3)
+    assert m["turnover"] == 3370.0
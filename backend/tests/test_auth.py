@@ -0,0 +1,30 @@
+"""Token verification: decoded Firebase tokens are cached until they expire."""
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+from firebase_admin import auth as firebase_auth
+
+import auth
+
+
+def test_verify_token_caches_uid_until_exp(monkeypatch):
+    calls = []
+    exp = {"tok-live": time.time() + 3600, "tok-expired": time.time() - 1}
+
+    def fake_verify(token):
+        calls.append(token)
+        return {"uid": f"uid-{token}", "exp": exp[token]}
+
+    monkeypatch.setattr(auth, "DISABLE_AUTH", False)
+    monkeypatch.setattr(auth, "_get_firebase_app", lambda: None)
+    monkeypatch.setattr(firebase_auth, "verify_id_token", fake_verify)
+    auth._token_cache.clear()
+
+    def verify(token):
+        return auth.verify_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+
+    assert verify("tok-live") == verify("tok-live") == "uid-tok-live"
+    assert calls == ["tok-live"]
+    verify("tok-expired")
+    verify("tok-expired")
+    assert calls == ["tok-live", "tok-expired", "tok-expired"]
@@ -0,0 +1,74 @@
+"""Backtest driver: the Strategy.signals() path must reproduce the per-bar update() loop."""
+import numpy as np
+import pytest
+
+from backtest import Backtest
+from portfolio import Portfolio
+from strategy import Strategy
+from tests.helpers import random_stock
+
+
+def _signals(stock):
+    sma = np.array(stock.sma(20), dtype=float)
+    close = stock.ohlc_arrays()[3]
+    above = close > sma
+    entries = above & ~np.roll(above, 1)
+    exits = ~above & np.roll(above, 1)
+    sizes = np.where(np.arange(close.size) % 2 == 0, 15.0, 40.0)
+    return entries, exits, sizes
+
+
+class _SignalStrategy(Strategy):
+    def signals(self):
+        return _signals(self.stock)
+
+
+class _LoopStrategy(Strategy):
+    def start(self, candle=None):
+        self.entries, self.exits, self.sizes = _signals(self.stock)
+
+    def update(self, open, high, low, close, index=None):
+        pos = self.portfolio.get_position(self.stock)
+        try:
+            if self.exits[index] and pos is not None:
+                self.portfolio.exit_position(self.stock, abs(pos["quantity"]), index=index)
+                pos = None
+            if self.entries[index] and pos is None:
+                self.portfolio.enter_position_long(self.stock, self.sizes[index], index=index)
+        except ValueError:
+            pass
+
+
+def _run(strategy_cls, stock, cash):
+    port = Portfolio()
+    port.add_cash(cash)
+    port.set_commission_per_order(1.0)
+    port.fill_at_next_open = True
+    port.record_equity_per_bar = True
+    values = []
+    Backtest(strategy_cls(stock, port), port).run(30, 480, on_bar=lambda i, v: values.append((i, v)))
+    return port, values
+
+
+@pytest.mark.parametrize("cash", [100_000.0, 3_000.0])  # the small account has entries rejected for cash
+def test_signals_path_matches_update_loop(cash):
+    stock = random_stock()
+    fast, fast_values = _run(_SignalStrategy, stock, cash)
+    slow, slow_values = _run(_LoopStrategy, stock, cash)
+    assert len(fast.trade_log) > 4
+    assert fast.trade_log == slow.trade_log
+    assert fast.equity_curve == slow.equity_curve
+    assert fast_values == slow_values
+    assert fast.cash == slow.cash
+
+
+def test_signals_must_cover_every_bar():
+    class Short(Strategy):
+        def signals(self):
+            return [True] * 5, [False] * 5, 1
+
+    stock = random_stock(n=50)
+    port = Portfolio()
+    port.add_cash(1000.0)
+    with pytest.raises(ValueError, match="one value per bar"):
+        Backtest(Short(stock, port), port).run(0, 49)
@@ -0,0 +1,145 @@
+"""OHLC disk cache: served when fresh, refetched after a market close."""
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import data_provider
+
+
+def _yahoo_frame():
+    dates = pd.DatetimeIndex(["2024-01-02", "2024-01-03"])
+    return pd.DataFrame(
+        {"Open": [10.0, 11.0], "High": [12.0, 12.5], "Low": [9.5, 10.5], "Close": [11.0, 12.0], "Volume": [1e6, 2e6]},
+        index=dates,
+    )
+
+
+def test_get_ohlc_uses_disk_cache_until_next_close(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_download(*args, **kwargs):
+        calls.append(args)
+        return _yahoo_frame()
+
+    monkeypatch.setattr(data_provider, "OHLC_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(data_provider.yf, "download", fake_download)
+
+    first = data_provider.get_ohlc("TEST", "2024-01-01", "2024-01-04")
+    second = data_provider.get_ohlc("TEST", "2024-01-01", "2024-01-04")
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(first, second, check_freq=False)
+
+    # A file written before the last market close is stale.
+    path = tmp_path / "TEST_2024-01-01_2024-01-04.npz"
+    old = data_provider._last_market_close().timestamp() - 60
+    os.utime(path, (old, old))
+    data_provider.get_ohlc("TEST", "2024-01-01", "2024-01-04")
+    assert len(calls) == 2
+
+
+def test_last_market_close_skips_weekends():
+    sunday_noon_utc = datetime(2024, 1, 7, 17, 0, tzinfo=timezone.utc)
+    close = data_provider._last_market_close(sunday_noon_utc)
+    assert (close.year, close.month, close.day, close.hour, close.minute) == (2024, 1, 5, 16, 30)
+
+
+def test_get_ohlc_many_batches_cache_misses(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_download(tickers, *args, **kwargs):
+        calls.append(list(tickers))
+        return pd.concat({t: _yahoo_frame() for t in tickers if t != "NODATA"}, axis=1)
+
+    monkeypatch.setattr(data_provider, "OHLC_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(data_provider.yf, "download", fake_download)
+
+    frames = data_provider.get_ohlc_many(["AAA", "BBB", "NODATA"], "2024-01-01", "2024-01-04")
+    assert calls == [["AAA", "BBB", "NODATA"]]
+    assert list(frames["AAA"]["Close"]) == [11.0, 12.0]
+    assert frames["NODATA"].empty
+
+    # Cached symbols are not requested again.
+    data_provider.get_ohlc_many(["AAA", "CCC"], "2024-01-01", "2024-01-04")
+    assert calls[-1] == ["CCC"]
+
+
+def test_clean_ohlc_drops_inconsistent_rows():
+    df = pd.DataFrame(
+        {
+            "Open": [10.0, 11.0, 10.0, -1.0],
+            "High": [12.0, 10.0, 12.0, 12.0],
+            "Low": [9.5, 10.5, 9.5, 9.5],
+            "Close": [11.0, 10.8, 12.5, 11.0],
+            "Volume": 1e6,
+        },
+        index=pd.bdate_range("2024-01-02", periods=4),
+    )
+    out = data_provider._clean_ohlc(df, "TEST")
+    assert list(out.index) == [pd.Timestamp("2024-01-02")]
+
+
+def test_get_ohlc_serves_narrower_window_from_wider_cached_fetch(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_download(*args, **kwargs):
+        calls.append(kwargs)
+        return _yahoo_frame()
+
+    monkeypatch.setattr(data_provider, "OHLC_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(data_provider.yf, "download", fake_download)
+
+    data_provider.get_ohlc("TEST", "2024-01-01", "2024-01-04")
+    inner = data_provider.get_ohlc("TEST", "2024-01-03", "2024-01-04")
+    assert len(calls) == 1
+    assert list(inner["Close"]) == [12.0]
+    # End is exclusive, matching yfinance.
+    assert list(data_provider.get_ohlc("TEST", "2024-01-01", "2024-01-03")["Close"]) == [11.0]
+    assert len(calls) == 1
+
+    # A window reaching past the cached fetch still downloads.
+    data_provider.get_ohlc("TEST", "2024-01-01", "2024-01-05")
+    assert len(calls) == 2
+
+
+def test_cache_write_evicts_stale_and_covered_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_provider, "OHLC_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(data_provider.yf, "download", lambda *args, **kwargs: _yahoo_frame())
+
+    data_provider.get_ohlc("TEST", "2024-01-02", "2024-01-03")  # covered by the wider fetch below
+    data_provider.get_ohlc("TEST", "2023-12-01", "2023-12-05")  # outside it, but stale
+    stale = tmp_path / "TEST_2023-12-01_2023-12-05.npz"
+    old = data_provider._last_market_close().timestamp() - 60
+    os.utime(stale, (old, old))
+    data_provider.get_ohlc("OTHER", "2024-01-02", "2024-01-03")
+
+    data_provider.get_ohlc("TEST", "2024-01-01", "2024-01-04")
+    assert sorted(p.name for p in tmp_path.glob("*.npz")) == [
+        "OTHER_2024-01-02_2024-01-03.npz",
+        "TEST_2024-01-01_2024-01-04.npz",
+    ]
+
+
+def test_stale_wider_cached_fetch_is_not_loaded(tmp_path, monkeypatch):
+    calls, loads = [], []
+    read_cache = data_provider._read_cache
+
+    def fake_download(*args, **kwargs):
+        calls.append(kwargs)
+        return _yahoo_frame()
+
+    def counting_read_cache(path):
+        loads.append(path.name)
+        return read_cache(path)
+
+    monkeypatch.setattr(data_provider, "OHLC_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(data_provider.yf, "download", fake_download)
+    monkeypatch.setattr(data_provider, "_read_cache", counting_read_cache)
+
+    data_provider.get_ohlc("TEST", "2024-01-01", "2024-01-04")
+    old = data_provider._last_market_close().timestamp() - 60
+    os.utime(tmp_path / "TEST_2024-01-01_2024-01-04.npz", (old, old))
+    loads.clear()
+    data_provider.get_ohlc("TEST", "2024-01-03", "2024-01-04")
+    assert len(calls) == 2
+    assert loads == ["TEST_2024-01-03_2024-01-04.npz"]  # only the exact key; the stale wider file is skipped
@@ -0,0 +1,191 @@
+"""Stock indicators and data access: NumPy/Numba paths must match the reference pandas formulas."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import stock as stock_module
+from stock import Stock
+from tests.helpers import random_stock
+
+
+def _assert_close(actual, expected, tol=1e-9):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        if e is None or (isinstance(e, float) and np.isnan(e)):
+            assert a is None
+        else:
+            assert a == pytest.approx(e, rel=tol, abs=tol)
+
+
+def _reference_rsi(close: pd.Series, period: int) -> list:
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0.0)
+    loss = (-delta).where(delta < 0, 0.0)
+    avg_gain = gain.ewm(alpha=1 / period, adjust=False).mean()
+    avg_loss = loss.ewm(alpha=1 / period, adjust=False).mean()
+    rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+    rsi = rsi.where(avg_loss > 0, 100.0)
+    rsi.iloc[:period] = np.nan
+    return rsi.tolist()
+
+
+def _reference_tr(df: pd.DataFrame) -> pd.Series:
+    prev_close = df["Close"].shift(1)
+    hl = df["High"] - df["Low"]
+    tr = pd.concat([hl, (df["High"] - prev_close).abs(), (df["Low"] - prev_close).abs()], axis=1).max(axis=1)
+    tr.iloc[0] = hl.iloc[0]
+    return tr
+
+
+def _reference_wilder(x: pd.Series, period: int) -> pd.Series:
+    seeded = pd.concat([pd.Series([x.iloc[1 : period + 1].mean()], index=[x.index[period]]), x.iloc[period + 1 :]])
+    out = pd.Series(np.nan, index=x.index)
+    out.iloc[period:] = seeded.ewm(alpha=1 / period, adjust=False).mean().values
+    return out
+
+
+def _reference_dm(df: pd.DataFrame):
+    up, down = df["High"].diff(), -df["Low"].diff()
+    plus_dm = up.where((up > down) & (up > 0), 0.0)
+    minus_dm = down.where((down > up) & (down > 0), 0.0)
+    plus_dm.iloc[0] = minus_dm.iloc[0] = 0
+    return plus_dm, minus_dm
+
+
+def _reference_adx(df: pd.DataFrame, period: int) -> list:
+    atr = _reference_wilder(_reference_tr(df), period).to_numpy()
+    plus_dm, minus_dm = _reference_dm(df)
+    sp = _reference_wilder(plus_dm, period).fillna(0).to_numpy()
+    sm = _reference_wilder(minus_dm, period).fillna(0).to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pdi = np.where(atr > 0, 100 * sp / atr, 0)
+        mdi = np.where(atr > 0, 100 * sm / atr, 0)
+        dx = np.where(pdi + mdi > 0, 100 * np.abs(pdi - mdi) / (pdi + mdi), 0)
+    adx_init = pd.Series([np.mean(dx[period : 2 * period])])
+    smoothed = pd.concat([adx_init, pd.Series(dx[2 * period :])]).ewm(alpha=1 / period, adjust=False).mean()
+    out = np.full(len(dx), np.nan)
+    out[2 * period - 1] = smoothed.iloc[0]
+    out[2 * period :] = smoothed.values[1:]
+    return out.tolist()
+
+
+@pytest.mark.parametrize("period", [2, 14, 30])
+def test_rsi_matches_pandas_reference(period):
+    stock = random_stock()
+    _assert_close(stock.rsi(period), _reference_rsi(stock.df["Close"], period))
+
+
+def test_rsi_empty_history():
+    stock = Stock("TEST", df=random_stock().df.iloc[:0])
+    assert stock.rsi(14) == []
+
+
+@pytest.mark.parametrize("period", [2, 14, 30])
+def test_atr_matches_pandas_reference(period):
+    stock = random_stock()
+    _assert_close(stock.atr(period), _reference_wilder(_reference_tr(stock.df), period).tolist())
+
+
+@pytest.mark.parametrize("period", [2, 14, 30])
+def test_adx_matches_pandas_reference(period):
+    stock = random_stock()
+    _assert_close(stock.adx(period), _reference_adx(stock.df, period), tol=1e-7)
+
+
+def test_tr_and_dm_match_pandas_reference():
+    stock = random_stock()
+    tr = _reference_tr(stock.df).tolist()
+    assert [stock.tr(i) for i in range(len(tr))] == pytest.approx(tr)
+    plus_dm, minus_dm = _reference_dm(stock.df)
+    assert stock.dm() == (pytest.approx(plus_dm.tolist()), pytest.approx(minus_dm.tolist()))
+
+
+def test_adx_short_history_is_all_none():
+    stock = random_stock(n=20)
+    assert stock.adx(14) == [None] * 20
+
+
+@pytest.mark.parametrize("bottleneck", [True, False])
+@pytest.mark.parametrize("period", [1, 20, 600])
+def test_sma_and_bollinger_match_pandas_reference(period, bottleneck, monkeypatch):
+    if not bottleneck:
+        monkeypatch.setattr(stock_module, "bn", None)
+    stock = random_stock()
+    close = stock.df["Close"]
+    middle = close.rolling(window=period).mean()
+    std = close.rolling(window=period).std()
+    _assert_close(stock.sma(period), middle.tolist())
+    bands = stock.bollinger_bands(period, dev=2)
+    _assert_close([b[0] for b in bands], (middle + 2 * std).tolist())
+    _assert_close([b[1] for b in bands], middle.tolist())
+    _assert_close([b[2] for b in bands], (middle - 2 * std).tolist())
+
+
+def test_ema_and_macd_match_pandas_reference():
+    stock = random_stock()
+    close = stock.df["Close"]
+    _assert_close(stock.ema(14), close.ewm(span=14, adjust=False).mean().tolist())
+    macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    macd.iloc[:26] = np.nan
+    _assert_close(stock.macd(26, 12), macd.tolist())
+
+
+def test_to_iloc_date_lookup_matches_ffill_indexer():
+    stock = random_stock(n=50)
+    for date in ["2014-12-31", "2015-01-02", "2015-01-03", "2015-02-14", "2015-03-13", "2030-01-01"]:
+        expected = stock.df.index.get_indexer([pd.Timestamp(date)], method="ffill")[0]
+        assert stock.to_iloc(date) == max(0, min(expected, len(stock.df) - 1))
+
+
+def test_from_arrays_matches_dataframe_stock():
+    expected = random_stock(n=60)
+    df = expected.df
+    stock = Stock.from_arrays("test", df.index, *(df[c].to_numpy() for c in ("Open", "High", "Low", "Close")))
+    assert stock._df is None
+    assert stock.symbol == "TEST"
+    assert stock.to_iloc("2015-02-14") == expected.to_iloc("2015-02-14")
+    assert stock.get_candle(30) == expected.get_candle(30)
+    _assert_close(stock.rsi(14), expected.rsi(14))
+    assert stock._df is None
+    pd.testing.assert_frame_equal(stock.df, df[["Open", "High", "Low", "Close"]], check_freq=False)
+
+
+@pytest.mark.parametrize("tz", [None, "America/New_York"])
+def test_iso_date_matches_timestamp_isoformat(tz):
+    dates = pd.date_range("1969-12-25 23:30", periods=40, freq="D", tz=tz)
+    stock = Stock.from_arrays("test", dates, *([np.ones(len(dates))] * 4))
+    assert [stock.iso_date(i) for i in range(len(dates))] == [d.isoformat()[:10] for d in dates]
+
+
+def test_indicator_index_returns_that_bar_of_the_list():
+    stock = random_stock(n=80)
+    for series, at in (
+        (stock.sma(20), lambda i: stock.sma(20, index=i)),
+        (stock.rsi(14), lambda i: stock.rsi(14, index=i)),
+        (stock.macd(26, 12), lambda i: stock.macd(26, 12, index=i)),
+        (stock.adx(14), lambda i: stock.adx(14, index=i)),
+        (stock.bollinger_bands(20, 2), lambda i: stock.bollinger_bands(20, 2, index=i)),
+    ):
+        assert [at(i) for i in range(len(series))] == series
+    assert stock.sma(20, index=stock.dates[40].strftime("%Y-%m-%d")) == stock.sma(20)[40]
+
+
+def test_indicator_arrays_are_memoized_and_read_only():
+    stock = random_stock()
+    assert stock._sma_array(20) is stock._sma_array(20)
+    assert stock._adx_arrays(14) is stock._adx_arrays(14)
+    with pytest.raises(ValueError):
+        stock._rsi_array(14)[0] = 1.0
+    # Public lists are fresh copies, so strategy code cannot corrupt the shared cache.
+    stock.sma(20)[25] = -1.0
+    assert stock.sma(20)[25] != -1.0
+
+
+def test_float32_dtype_stays_within_tolerance(monkeypatch):
+    df = random_stock(n=5000).df
+    expected = Stock("TEST", df=df)
+    monkeypatch.setattr(Stock, "DTYPE", np.float32)
+    stock = Stock("TEST", df=df)
+    assert stock._close.dtype == np.float32
+    for name in ("rsi", "atr", "adx"):
+        _assert_close(getattr(stock, name)(14), getattr(expected, name)(14), tol=1e-4)
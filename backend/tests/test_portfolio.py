@@ -0,0 +1,20 @@
+"""Portfolio fill pricing."""
+import pytest
+
+from portfolio import Portfolio
+from stock import make_minimal_stock
+
+
+def test_slippage_moves_fills_against_the_trader():
+    port = Portfolio()
+    port.add_cash(10_000)
+    port.set_slippage(0.01)
+    assert port.estimate_fill_price("buy", 100.0) == pytest.approx(101.0)
+    assert port.estimate_fill_price("sell", 100.0) == pytest.approx(99.0)
+
+    stock = make_minimal_stock("TEST")  # closes 101, 102
+    port.enter_position_long(stock, 10, index=1)
+    port.exit_position(stock, 10, index=1)
+    port.enter_position_short(stock, 10, index=1)
+    fills = [(t["type"], t["fill_price"]) for t in port.trade_log]
+    assert fills == [("long", pytest.approx(103.02)), ("exit", pytest.approx(100.98)), ("short", pytest.approx(100.98))]
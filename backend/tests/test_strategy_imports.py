@@ -1,7 +1,7 @@
 """Strategy sandbox: whitelisted imports only."""
 import pytest
 
-from backtest import STRATEGY_ALLOWED_IMPORT_ROOTS, _validate_strategy_code, create_strategy_from_code
+from backtest import STRATEGY_ALLOWED_IMPORT_ROOTS, _compile_strategy, _validate_strategy_code, create_strategy_from_code
 from portfolio import Portfolio
 from stock import make_minimal_stock
 
@@ -63,3 +63,44 @@ class MyStrategy(Strategy):
 def test_allowed_roots_is_sorted_documentation():
     """Keep frozenset explicit in source; this guards against accidental duplicates."""
     assert len(STRATEGY_ALLOWED_IMPORT_ROOTS) == len(set(STRATEGY_ALLOWED_IMPORT_ROOTS))
+
+
+def test_compiled_strategy_is_cached_but_instances_are_fresh():
+    code = """
+class S(Strategy):
+    hits = []
+    def __init__(self, stock, portfolio):
+        super().__init__(stock, portfolio)
+        S.hits.append(1)
+"""
+    stock = make_minimal_stock("TEST")
+    first = create_strategy_from_code(stock, Portfolio(), code)
+    hits_before = _compile_strategy.cache_info().hits
+    second = create_strategy_from_code(stock, Portfolio(), code)
+    assert _compile_strategy.cache_info().hits == hits_before + 1
+    # Each run re-executes the module body, so class-level state is not shared.
+    assert type(first) is not type(second)
+    assert second.hits == [1]
+
+
+def test_timed_out_strategy_does_not_block_later_ones(monkeypatch):
+    import backtest
+
+    spin = (
+        "class S(Strategy):\n"
+        "    def __init__(self, stock, portfolio):\n"
+        "        super().__init__(stock, portfolio)\n"
+        "        while self.portfolio.cash == 0:\n"
+        "            pass\n"
+    )
+    stuck = Portfolio()  # zero cash keeps the constructor above spinning until the finally block
+    monkeypatch.setattr(backtest, "STRATEGY_EXEC_TIMEOUT", 0.2)
+    try:
+        for _ in range(3):
+            with pytest.raises(ValueError, match="timed out"):
+                create_strategy_from_code(make_minimal_stock(), stuck, spin)
+        monkeypatch.setattr(backtest, "STRATEGY_EXEC_TIMEOUT", 5)
+        ok = create_strategy_from_code(make_minimal_stock(), Portfolio(), spin.replace("== 0", "!= 0"))
+        assert ok.portfolio.cash == 0
+    finally:
+        stuck.cash = 1.0
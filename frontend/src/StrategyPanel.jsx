@@ -419,6 +419,7 @@ export function StrategyPanel({ watchlist, refresh, onRefresh, onRunCompleted, c
                         <li><code>stock.bollinger_bands(period=20, dev=2)</code> → list of (upper, middle, lower) tuples per bar</li>
                         <li><code>stock.tr(index)</code> → float, True Range at bar</li>
                         <li><code>stock.dm()</code> → (plus_dm_list, minus_dm_list)</li>
+                        <li>Pass <code>index=</code> to any indicator above for just that bar, e.g. <code>stock.sma(14, index=index)</code> (faster inside <code>update()</code>)</li>
                       </ul>
                     </div>
                     <div className="strategy-api-section">